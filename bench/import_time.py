@@ -0,0 +1,93 @@
+"""
+Cold start of 1 worker: time to import src/app.py, memory (RSS) after the import and the packages that cost the most,
+with the admin built at start (default), ADMIN_MODE=lazy and API_ONLY=1 (see src/admin.py)
+uses python -X importtime, every run is a new python process (like a new gunicorn worker without --preload)
+
+$ python bench/import_time.py
+$ python bench/import_time.py --runs 10 --top 20 --output import_time.json
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+MODES = {
+    'eager_admin': {},
+    'lazy_admin': {'ADMIN_MODE': 'lazy'},
+    'api_only': {'API_ONLY': '1'},
+}
+
+# runs in the child: imports + builds the app and prints how long it took + the max RSS of the process
+CHILD = '''
+import json, time, resource
+start = time.perf_counter()
+import app
+app.create_app()
+print(json.dumps({'seconds': time.perf_counter() - start,
+                  'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}))
+'''
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite:////tmp/bench_import.db')
+    parser.add_argument('--runs', type=int, default=5, help='python processes per mode')
+    parser.add_argument('--top', type=int, default=15, help='packages to show per mode')
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    return parser.parse_args()
+
+
+def parse_importtime(stderr):
+    # 'import time:  self [us] | cumulative | name' -> cumulative ms of each top package (flask_admin, sqlalchemy...)
+    # a package's 1st line is the biggest one, the deeper ones are already counted in it
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        package = name.strip().split('.')[0]
+        if package == 'app':  # = the whole import
+            continue
+        packages[package] = max(packages.get(package, 0), int(cumulative) / 1000)
+    return packages
+
+
+def run_mode(args, env_vars):
+    env = dict(os.environ, DATABASE_URL=args.database_url, **env_vars)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [SRC, env.get('PYTHONPATH')]))
+    seconds, rss, packages = [], [], {}
+    for _ in range(args.runs):
+        child = subprocess.run([sys.executable, '-X', 'importtime', '-c', CHILD], env=env, cwd=SRC,
+                               capture_output=True, text=True, check=True)
+        result = json.loads(child.stdout.strip().splitlines()[-1])
+        seconds.append(result['seconds'])
+        rss.append(result['rss_mb'])
+        for package, ms in parse_importtime(child.stderr).items():
+            packages.setdefault(package, []).append(ms)
+    slowest = sorted(((statistics.median(times), package) for package, times in packages.items()), reverse=True)
+    return {
+        'import_ms': round(statistics.median(seconds) * 1000, 1),
+        'rss_mb': round(statistics.median(rss), 1),
+        'slowest_packages_ms': {package: round(ms, 1) for ms, package in slowest[:args.top]},
+    }
+
+
+def main():
+    args = parse_args()
+    report = {'python': sys.version.split()[0], 'runs': args.runs, 'modes': {}}
+    for mode, env_vars in MODES.items():
+        print('{}...'.format(mode), file=sys.stderr)
+        report['modes'][mode] = run_mode(args, env_vars)
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
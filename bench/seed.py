@@ -0,0 +1,76 @@
+"""
+Fills a database with fake SWAPI-like data to measure the API
+e.g. seed(engine, users=1000, catalog=500, favorites_per_user=5)
+"""
+import os
+import sys
+import random
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from models import Users, Planets, Vehicles, Characters, Favorite_Characters, Favorite_Planets, Favorite_Vehicles  # noqa: E402
+
+BATCH_SIZE = 10000
+FAVORITES = [(Favorite_Characters, Characters, 'character_id'),
+             (Favorite_Planets, Planets, 'planet_id'),
+             (Favorite_Vehicles, Vehicles, 'vehicle_id')]
+
+
+def fake_user(i):
+    return {'name': 'User {}'.format(i), 'country': random.choice(['Spain', 'UK', 'Chile', 'USA']),
+            'birthday': '19{:02d}-01-01'.format(i % 100), 'email': 'user{}@example.com'.format(i), 'password': 'password'}
+
+
+def fake_planet(i):
+    return {'name': 'Planet {}'.format(i), 'diameter': random.randint(1000, 200000),
+            'rotation_period': random.randint(10, 50), 'orbital_period': random.randint(100, 5000),
+            'population': random.randint(0, 10 ** 9), 'surface_water': random.randint(0, 100),
+            'climate': random.choice(['arid', 'temperate', 'frozen', 'murky', 'tropical']),
+            'terrain': random.choice(['desert', 'grasslands', 'tundra', 'swamp', 'jungle', 'ocean'])}
+
+
+def fake_vehicle(i):
+    return {'name': 'Vehicle {}'.format(i), 'model': 'Model {}'.format(i % 500),
+            'vehicle_class': random.choice(['wheeled', 'repulsorcraft', 'starfighter', 'walker', 'speeder']),
+            'manufacturer': random.choice(['Incom', 'Kuat', 'Sienar', 'Corellia']), 'consumables': '{} days'.format(i % 30),
+            'cost_in_credits': random.randint(1000, 10 ** 7), 'crew': random.randint(1, 50), 'length': round(random.uniform(1, 100), 1),
+            'max_atmosphering_speed': random.randint(100, 2000), 'cargo_capacity': random.randint(0, 10 ** 6)}
+
+
+def fake_character(i):
+    return {'name': 'Character {}'.format(i), 'gender': random.choice(['male', 'female', 'n/a']),
+            'height': random.randint(60, 250), 'mass': random.randint(20, 200),
+            'hair_color': random.choice(['blond', 'brown', 'black', 'none']), 'eye_color': random.choice(['blue', 'brown', 'red']),
+            'birth_year': '{}BBY'.format(i % 1000)}
+
+
+def insert_many(connection, model, rows):
+    # executemany in batches -> fast even with millions of rows
+    batch = []
+    for row in rows:
+        batch.append(row)
+        if len(batch) == BATCH_SIZE:
+            connection.execute(model.__table__.insert(), batch)
+            batch = []
+    if batch:
+        connection.execute(model.__table__.insert(), batch)
+
+
+def fake_favorites(users, catalog, favorites_per_user, column):
+    for user_id in range(1, users + 1):
+        # random.sample -> a user never favorites the same thing twice
+        for item_id in random.sample(range(1, catalog + 1), min(favorites_per_user, catalog)):
+            yield {'user_id': user_id, column: item_id}
+
+
+def seed(engine, users=1000, catalog=1000, favorites_per_user=5, random_seed=42):
+    # users = how many users, catalog = how many planets AND vehicles AND characters
+    # the tables must be empty: the favorites expect the ids to be 1, 2, 3... (no explicit ids -> the sequences stay right)
+    random.seed(random_seed)
+    with engine.begin() as connection:
+        insert_many(connection, Users, (fake_user(i) for i in range(1, users + 1)))
+        insert_many(connection, Planets, (fake_planet(i) for i in range(1, catalog + 1)))
+        insert_many(connection, Vehicles, (fake_vehicle(i) for i in range(1, catalog + 1)))
+        insert_many(connection, Characters, (fake_character(i) for i in range(1, catalog + 1)))
+        for favorite_model, item_model, column in FAVORITES:
+            insert_many(connection, favorite_model, fake_favorites(users, catalog, favorites_per_user, column))
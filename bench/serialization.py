@@ -0,0 +1,99 @@
+"""
+Rows/sec of the "GET ALL" serialization: ORM objects + serialize() + jsonify (before)
+vs serialized columns (Core select) + jsonify vs serialized columns + orjson (src/serialization.py)
+WARNING: it DELETES and re-seeds the database it's given
+
+$ python bench/serialization.py                          (sqlite:////tmp/bench_serialization.db, 1000 rows per page)
+$ python bench/serialization.py --catalog 50000 --page-size 1000 --repeat 20
+"""
+import os
+import sys
+import json
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--database-url', default='sqlite:////tmp/bench_serialization.db')
+    parser.add_argument('--catalog', type=int, default=10000, help='planets, vehicles AND characters')
+    parser.add_argument('--page-size', type=int, default=1000, help='rows per reply (like ?limit=)')
+    parser.add_argument('--repeat', type=int, default=20, help='replies per model and path')
+    return parser.parse_args()
+
+
+def paginate_orm(model):
+    # the old path of GET ALL, before paginate_serialized(): 1 page of ORM objects
+    # SQL Equiv. = SELECT * FROM x WHERE id > <cursor> ORDER BY id LIMIT <limit + 1>
+    from pagination import get_page_args, after_cursor, encode_cursor
+    limit, last_id = get_page_args()
+    query = model.query
+    if last_id is not None:
+        query = query.filter(after_cursor(model, None, last_id))
+    rows = query.order_by(model.id).limit(limit + 1).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].id)
+    return rows, next_cursor
+
+
+def main():
+    args = parse_args()
+    # create_app() reads DATABASE_URL, MAX_PAGE_SIZE is read by pagination.py
+    os.environ['DATABASE_URL'] = args.database_url
+    os.environ['MAX_PAGE_SIZE'] = str(max(args.page_size, int(os.environ.get('MAX_PAGE_SIZE', 1000))))
+    from flask import jsonify
+    from seed import seed
+    from app import create_app
+    from models import db, Users, Planets, Vehicles, Characters
+    from pagination import paginate_serialized
+    import serialization
+
+    app = create_app()
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        print('seeding {} of each catalog...'.format(args.catalog), file=sys.stderr)
+        seed(db.engine, users=args.catalog, catalog=args.catalog, favorites_per_user=0)
+
+    def orm_jsonify(model):
+        rows, next_cursor = paginate_orm(model)
+        return jsonify({'msg': 'ok', 'info': [row.serialize() for row in rows], 'next_cursor': next_cursor})
+
+    def columns_jsonify(model):
+        rows, next_cursor = paginate_serialized(model)
+        return jsonify({'msg': 'ok', 'info': rows, 'next_cursor': next_cursor})
+
+    def columns_orjson(model):
+        rows, next_cursor = paginate_serialized(model)
+        return serialization.json_response({'msg': 'ok', 'info': rows, 'next_cursor': next_cursor})[0]
+
+    paths = {'orm + serialize() + jsonify (before)': orm_jsonify,
+             'columns + jsonify': columns_jsonify,
+             'columns + orjson (now)': columns_orjson}
+    report = {'database': args.database_url.split(':')[0], 'page_size': args.page_size, 'repeat': args.repeat,
+              'orjson_installed': serialization.orjson is not None, 'models': {}}
+    for model in [Users, Planets, Vehicles, Characters]:
+        results = report['models'][model.__tablename__] = {}
+        bodies = {}
+        for name, build_reply in paths.items():
+            with app.test_request_context('/?limit={}'.format(args.page_size)):
+                bodies[name] = build_reply(model).get_data()  # warm up (+ the bytes to compare)
+                start = time.perf_counter()
+                for i in range(args.repeat):
+                    build_reply(model).get_data()
+                    db.session.expunge_all()  # like a new request: no objects left in the session
+                elapsed = time.perf_counter() - start
+            rows = len(json.loads(bodies[name])['info']) * args.repeat
+            results[name] = {'rows_per_sec': round(rows / elapsed), 'ms_per_reply': round(elapsed / args.repeat * 1000, 3)}
+        results['same_bytes'] = len(set(bodies.values())) == 1
+
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
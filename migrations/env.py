@@ -1,5 +1,6 @@
 from __future__ import with_statement
 
+import re
 import logging
 from logging.config import fileConfig
 
@@ -38,6 +39,20 @@ def get_metadata():
     return target_db.metadata
 
 
+# made by hand in search.py / migration 7a3c9e5f1d28, not by the models: autogenerate must not drop them
+# sqlite FTS5 table x_search + the tables it makes itself (x_search_data, x_search_idx...)
+SEARCH_TABLE = re.compile(r'^\w+_search(_data|_idx|_docsize|_config)?$')
+SEARCH_INDEX = re.compile(r'^ix_\w+_name_(lower|trgm)$')
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    if type_ == 'table' and reflected and compare_to is None and SEARCH_TABLE.match(name):
+        return False
+    if type_ == 'index' and reflected and compare_to is None and SEARCH_INDEX.match(name or ''):
+        return False
+    return True
+
+
 def run_migrations_offline():
     """Run migrations in 'offline' mode.
 
@@ -52,7 +67,8 @@ def run_migrations_offline():
     """
     url = config.get_main_option("sqlalchemy.url")
     context.configure(
-        url=url, target_metadata=get_metadata(), literal_binds=True
+        url=url, target_metadata=get_metadata(), literal_binds=True,
+        include_object=include_object
     )
 
     with context.begin_transaction():
@@ -84,6 +100,7 @@ def run_migrations_online():
             connection=connection,
             target_metadata=get_metadata(),
             process_revision_directives=process_revision_directives,
+            include_object=include_object,
             **current_app.extensions['migrate'].configure_args
         )
 
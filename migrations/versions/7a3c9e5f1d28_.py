@@ -0,0 +1,66 @@
+"""search index on the catalog names
+
+Revision ID: 7a3c9e5f1d28
+Revises: e81b5d0c6a4f
+Create Date: 2026-10-18 14:26:03.551870
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7a3c9e5f1d28'
+down_revision = 'e81b5d0c6a4f'
+branch_labels = None
+depends_on = None
+
+# same statements as src/search.py (db.create_all() uses those)
+TABLES = ['characters', 'planets', 'vehicles']
+POSTGRES_UPGRADE = [
+    'CREATE INDEX IF NOT EXISTS ix_{table}_name_lower ON {table} ((lower(name) COLLATE "C"))',
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS ix_{table}_name_trgm ON {table} USING gin (lower(name) gin_trgm_ops)',
+]
+POSTGRES_DOWNGRADE = ['DROP INDEX IF EXISTS ix_{table}_name_trgm', 'DROP INDEX IF EXISTS ix_{table}_name_lower']
+SQLITE_UPGRADE = [
+    'CREATE INDEX IF NOT EXISTS ix_{table}_name_lower ON {table} (lower(name))',
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {table}_search USING fts5(name, content='{table}', content_rowid='id', prefix='1 2 3')",
+    "INSERT INTO {table}_search({table}_search) VALUES ('rebuild')",
+    'CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN '
+    'INSERT INTO {table}_search(rowid, name) VALUES (new.id, new.name); END',
+    'CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN '
+    "INSERT INTO {table}_search({table}_search, rowid, name) VALUES ('delete', old.id, old.name); END",
+    'CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE OF name ON {table} BEGIN '
+    "INSERT INTO {table}_search({table}_search, rowid, name) VALUES ('delete', old.id, old.name); "
+    'INSERT INTO {table}_search(rowid, name) VALUES (new.id, new.name); END',
+]
+SQLITE_DOWNGRADE = [
+    'DROP TRIGGER IF EXISTS {table}_search_insert',
+    'DROP TRIGGER IF EXISTS {table}_search_delete',
+    'DROP TRIGGER IF EXISTS {table}_search_update',
+    'DROP TABLE IF EXISTS {table}_search',
+    'DROP INDEX IF EXISTS ix_{table}_name_lower',
+]
+
+
+def run(statements):
+    for table in TABLES:
+        for statement in statements:
+            op.execute(statement.format(table=table))
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        run(POSTGRES_UPGRADE)
+    elif dialect == 'sqlite':
+        run(SQLITE_UPGRADE)
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        run(POSTGRES_DOWNGRADE)
+    elif dialect == 'sqlite':
+        run(SQLITE_DOWNGRADE)
@@ -0,0 +1,49 @@
+"""indexes for the favorites and name lookups
+
+Revision ID: c4f1a9e2b7d3
+Revises: 12d7e294e742
+Create Date: 2026-10-18 10:40:12.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c4f1a9e2b7d3'
+down_revision = '12d7e294e742'
+branch_labels = None
+depends_on = None
+
+FAVORITE_TABLES = [('favorite_characters', 'character_id'),
+                   ('favorite_planets', 'planet_id'),
+                   ('favorite_vehicles', 'vehicle_id')]
+
+
+def upgrade():
+    # the old endpoints let a user favorite the same thing twice -> keep only the first one
+    # before adding the unique constraints
+    for table, column in FAVORITE_TABLES:
+        op.execute(
+            'DELETE FROM {table} WHERE id NOT IN '
+            '(SELECT MIN(id) FROM {table} GROUP BY user_id, {column})'.format(table=table, column=column))
+
+    for table, column in FAVORITE_TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_unique_constraint('uq_{}_user_id_{}'.format(table, column), ['user_id', column])
+            batch_op.create_index(batch_op.f('ix_{}_{}'.format(table, column)), [column], unique=False)
+
+    for table in ['characters', 'planets', 'vehicles']:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_index(batch_op.f('ix_{}_name'.format(table)), ['name'], unique=False)
+
+
+def downgrade():
+    for table in ['characters', 'planets', 'vehicles']:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(batch_op.f('ix_{}_name'.format(table)))
+
+    for table, column in FAVORITE_TABLES:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.drop_index(batch_op.f('ix_{}_{}'.format(table, column)))
+            batch_op.drop_constraint('uq_{}_user_id_{}'.format(table, column), type_='unique')
@@ -0,0 +1,35 @@
+"""indexes for the catalog filters and sorting
+
+Revision ID: e81b5d0c6a4f
+Revises: c4f1a9e2b7d3
+Create Date: 2026-10-18 13:12:47.902114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'e81b5d0c6a4f'
+down_revision = 'c4f1a9e2b7d3'
+branch_labels = None
+depends_on = None
+
+# (column, id) -> WHERE column = x ORDER BY id, ranges and ORDER BY column, id all read the index
+FILTER_COLUMNS = [('planets', ['population', 'diameter', 'climate', 'terrain']),
+                  ('vehicles', ['cost_in_credits', 'crew', 'max_atmosphering_speed', 'vehicle_class']),
+                  ('characters', ['height', 'mass', 'gender'])]
+
+
+def upgrade():
+    for table, columns in FILTER_COLUMNS:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column in columns:
+                batch_op.create_index('ix_{}_{}_id'.format(table, column), [column, 'id'], unique=False)
+
+
+def downgrade():
+    for table, columns in FILTER_COLUMNS:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column in columns:
+                batch_op.drop_index('ix_{}_{}_id'.format(table, column))
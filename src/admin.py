@@ -1,9 +1,17 @@
 import os
-from flask_admin import Admin
+import threading
+from flask import Flask
 from models import db, Users, Characters, Planets, Vehicles, Favorite_Characters, Favorite_Planets, Favorite_Vehicles
-from flask_admin.contrib.sqla import ModelView  # ModelView generates the GUI for our database 
+
+# ADMIN_MODE=eager (default) -> the admin is built when the app starts, like always
+# ADMIN_MODE=lazy            -> built on the 1st request to /admin (flask_admin is big: ~0.5s and many MB per worker)
+# API_ONLY=1                 -> no admin at all (see app.py)
 
 def setup_admin(app):
+    # imported here -> flask_admin is only loaded if the admin is really built
+    from flask_admin import Admin
+    from flask_admin.contrib.sqla import ModelView  # ModelView generates the GUI for our database 
+
     app.secret_key = os.environ.get('FLASK_APP_KEY', 'sample key')
     app.config['FLASK_ADMIN_SWATCH'] = 'cerulean'
     admin = Admin(app, name='4Geeks Admin', template_mode='bootstrap3')
@@ -20,4 +28,35 @@ def setup_admin(app):
 
 
     # You can duplicate that line to add mew models
-    # admin.add_view(ModelView(YourModelName, db.session))
\ No newline at end of file
+    # admin.add_view(ModelView(YourModelName, db.session))
+
+
+class LazyAdmin:
+    # WSGI middleware in front of the API: /admin/... goes to a small Flask app that only has the admin,
+    # built on the 1st request to /admin (Flask doesn't let us add routes to the API once it's serving)
+    def __init__(self, app):
+        self.app = app
+        self.wsgi_app = app.wsgi_app
+        self.admin_app = None
+        self.lock = threading.Lock()
+
+    def build_admin_app(self):
+        admin_app = Flask(__name__)
+        admin_app.config.update(self.app.config)  # same database, binds, pool options...
+        db.init_app(admin_app)
+        setup_admin(admin_app)
+        return admin_app
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path != '/admin' and not path.startswith('/admin/'):
+            return self.wsgi_app(environ, start_response)
+        if self.admin_app is None:
+            with self.lock:  # 2 threads on the 1st /admin -> built only once
+                if self.admin_app is None:
+                    self.admin_app = self.build_admin_app()
+        return self.admin_app(environ, start_response)
+
+
+def setup_lazy_admin(app):
+    app.wsgi_app = LazyAdmin(app)
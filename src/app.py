@@ -2,38 +2,75 @@
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
 import os  # let's us import variables (e.g. variable at end of file!)
-from flask import Flask, request, jsonify, url_for
+from flask import Flask, Blueprint, current_app, request, jsonify, url_for
 from flask_migrate import Migrate
-# swagger = to document and visualise our endpoints
-from flask_swagger import swagger
+from sqlalchemy.exc import IntegrityError
 # a way we can list from which source our API can be consulted
 from flask_cors import CORS
 # generates the API Live page
-from utils import APIException, generate_sitemap
-from admin import setup_admin
+from utils import APIException, is_unique_violation, generate_sitemap, generate_route_index, cached_page
+from admin import setup_admin, setup_lazy_admin
 from models import db, Users, Planets, Vehicles, Characters, Favorite_Characters, Favorite_Planets, Favorite_Vehicles
+from favorites import ALL_USERS_INFO_KEYS, get_favorites, get_user_favorites, get_favorite_fields, empty_favorites, iter_users_favorites, check_favorite_changes, change_user_favorites
+from streaming import wants_ndjson, ndjson_response
+from serialization import json_response
+from search import get_search_args, search_catalog
+from resources import RESOURCES
+from caching import get_id_by_name, name_cache
+from response_cache import cached_response
+from instrumentation import setup_query_timing
+from metrics import setup_metrics, metrics_response
+from compression import setup_compression
+from pool import engine_options
+from replicas import read_replica_binds, setup_read_replicas
 # from models import Person
 
-app = Flask(__name__)
-app.url_map.strict_slashes = False
-
-db_url = os.getenv("DATABASE_URL")
-if db_url is not None:
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace(
-        "postgres://", "postgresql://")
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-# MIGRATE
-MIGRATE = Migrate(app, db)
-db.init_app(app)
-CORS(app)
-setup_admin(app)
+# all the endpoints go in this blueprint, create_app() adds it to the app
+api = Blueprint('api', __name__)
+MIGRATE = Migrate()
+
+
+def create_app(config=None):
+    # builds the app: create_app() for gunicorn / flask run, create_app({'SQLALCHEMY_DATABASE_URI': ...}) for a bench...
+    # nothing connects to the db here -> safe with 'gunicorn --preload' (see gunicorn.conf.py)
+    app = Flask(__name__)
+    app.url_map.strict_slashes = False
+
+    db_url = os.getenv("DATABASE_URL")
+    if db_url is not None:
+        app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace(
+            "postgres://", "postgresql://")
+    else:
+        app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # API_ONLY=1 -> no /admin (faster boot, less memory per worker), ADMIN_MODE=lazy (see admin.py)
+    app.config['API_ONLY'] = os.environ.get('API_ONLY', '0') == '1'
+    app.config['ADMIN_MODE'] = os.environ.get('ADMIN_MODE', 'eager')
+    # what we get in config wins over the env variables
+    app.config.update(config or {})
+    # pool size, recycle, pre-ping, PgBouncer mode... from the DB_POOL_* env variables (see pool.py)
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', engine_options(app.config['SQLALCHEMY_DATABASE_URI']))
+    # DATABASE_READ_URLS -> 1 engine per read replica, used by the GET requests (see replicas.py)
+    app.config.setdefault('SQLALCHEMY_BINDS', read_replica_binds())
+
+    # MIGRATE
+    MIGRATE.init_app(app, db)
+    db.init_app(app)
+    CORS(app)
+    if app.config['ADMIN_MODE'] == 'lazy' and not app.config['API_ONLY']:
+        setup_lazy_admin(app)
+    elif not app.config['API_ONLY']:
+        setup_admin(app)
+    setup_query_timing(app)  # X-Query-Count + Server-Timing headers (see instrumentation.py)
+    setup_metrics(app)  # Prometheus metrics for /metrics (see metrics.py)
+    setup_compression(app)  # gzip / brotli replies (see compression.py), after setup_metrics
+    setup_read_replicas(app)
+    app.register_blueprint(api)
+    return app
 
 
 # Handle/serialize errors like a JSON object
-@app.errorhandler(APIException)
+@api.app_errorhandler(APIException)
 def handle_invalid_usage(error):
     return jsonify(error.to_dict()), error.status_code
 
@@ -41,410 +78,45 @@ def handle_invalid_usage(error):
 # ### HOME ENDPOINT "/" (home) ###
 
 # Generates API Live page with all our endpoints #
-@app.route('/')
+@api.route('/')
 def sitemap():
-    # imported from utils -> lists urls and returns page content
-    return generate_sitemap(app)
-
-
-# ### ENDPOINTS "/users" ###
-
-# GET 1 USER (DYNAMIC URL)
-@app.route('/users/<int:user_id>', methods=['GET'])
-def handle_oneUser(user_id):  # user_id = <int: user_id>
-    # SQL Equiv. = SELECT * FROM Users where ID = 1
-    user = Users.query.get(user_id)
-    # Handle errors
-    if user is None:
-        return jsonify({'error': 'The user with id {} doesn\'t exist'.format(user_id)}), 400
-    user_serialized = user.serialize()
-    return jsonify({'msg': 'ok', 'info': user_serialized}), 200
-
-# GET ALL USERS
-@app.route('/users', methods=['GET'])
-def handle_manyUsers():
-    # SQL Equiv. = SELECT * FROM Users
-    users = Users.query.all()
-    users_serialized = list(map(lambda x: x.serialize(), users))
-    return jsonify({'msg': 'ok', 'info': users_serialized})
-
-    # FILTERING USERS
-    # SQL Equiv = SELECT * FROM users WHERE ... = True:
-    # filtered_users = Users.query.filter_by(is_active=True) -> would need to add this col to my table
-    # filtered_users_serialize = list(map(lambda x: x.serialize(), users))
-    # return jsonify({'msg': 'ok', 'info': filtered_users_serialize})
-
-# POST (CREATE) 1 USER
-@app.route('/users', methods=['POST'])
-def create_user():
-    # Extract JSON data
-    body = request.get_json(silent=True)
-    # Handle errors
-    if body is None:
-        return jsonify({'error': 'You must send information with the body'}), 400
-    if 'name' not in body:
-        return jsonify({'error': 'You must give the user a name'}), 400
-
-    # Check: email must be unique
-    if Users.query.filter_by(email=body['email']).first() is not None:
-        return jsonify({'error': 'This email already exists'}), 400
-
-    # SQL Equiv. = INSERT INTO planet(name, ...) VALUES ('example', ...)
-    new_user = Users()
-    new_user.name = body['name']
-    new_user.country = body['country']
-    new_user.birthday = body['birthday']
-    new_user.email = body['email']
-    new_user.password = body['password']
-
-    db.session.add(new_user)  # adds new user to db
-    db.session.commit()  # like git commit, saves changes
-
-    return jsonify({'msg': 'ok'}), 200
-
-# PUT (UPDATE) 1 USER
-@app.route('/users/<int:user_id>', methods=['PUT'])
-def update_user(user_id):
-
-    # SQL Equiv. = SELECT * FROM Users where ID = 1
-    user = Users.query.get(user_id)
-    # Handle errors
-    if user is None:
-        return jsonify({'error': 'The user with id {} doesn\'t exist'.format(user_id)}), 400
-
-    # Extract JSON data
-    body = request.get_json(silent=True)
-    # Handle errors
-    if body is None:
-        return jsonify({'error': 'You must send information with the body'}), 400
-    # Update relevant categories
-    if "name" in body:
-        user.name = body['name']
-    if "country" in body:
-        user.country = body['country']
-    if "birthday" in body:
-        user.birthday = body['birthday']
-    if "email" in body:
-        user.email = body['email']
-    if "password" in body:
-        user.password = body['password']
-
-    db.session.commit()
-    return jsonify({'msg': 'ok'}), 200
-
-# DELETE 1 USER
-@app.route('/users/<int:user_id>', methods=['DELETE'])
-def delete_user(user_id):
-    user = Users.query.get(user_id)
-
-    # Handle errors
-    if user is None:
-        return jsonify({'error': 'The user with id {} doesn\'t exist'.format(user_id)}), 400
-
-    db.session.delete(user)
-    db.session.commit()
-    return jsonify({'msg': 'ok'}), 200
-
-
-# ### ENDPOINTS "/planets" ###
-
-# GET 1 PLANET (DYNAMIC URL)
-@app.route('/planets/<int:planet_id>', methods=['GET'])
-def handle_onePlanet(planet_id):  # planet_id = <int: planet_id>
-    # SQL Equiv. = SELECT * FROM Planets where ID = 1
-    planet = Planets.query.get(planet_id)
-    # Handle errors
-    if planet is None:
-        return jsonify({'error': 'The planet with id {} doesn\'t exist'.format(planet_id)}), 400
-    planet_serialized = planet.serialize()
-    return jsonify({'msg': 'ok', 'info': planet_serialized}), 200
-
-# GET ALL PLANETS
-@app.route('/planets', methods=['GET'])
-def handle_manyPlanets():
-    planets = Planets.query.all()  # SQL Equiv. = SELECT * FROM User
-    planets_serialized = list(map(lambda x: x.serialize(), planets))
-    return jsonify({'msg': 'ok', 'info': planets_serialized})
-
-# POST (CREATE) 1 PLANET
-@app.route('/planets', methods=['POST'])
-def create_planet():
-    # Extract JSON data
-    body = request.get_json(silent=True)
-    # Handle errors
-    if body is None:
-        return jsonify({'error': 'You must send information with the body'}), 400
-    if 'name' not in body:
-        return jsonify({'error': 'You must give the planet a name'}), 400
-
-    # SQL Equiv. = INSERT INTO planet(name, ...) VALUES ('example', ...)
-    new_planet = Planets()
-    new_planet.name = body['name']
-    new_planet.diameter = body['diameter']
-    new_planet.rotation_period = body['rotation_period']
-    new_planet.orbital_period = body['orbital_period']
-    new_planet.population = body['population']
-    new_planet.surface_water = body['surface_water']
-    new_planet.climate = body['climate']
-    new_planet.terrain = body['terrain']
-
-    db.session.add(new_planet)  # adds new user to db
-    db.session.commit()  # like git commit, saves changes
-
-    return jsonify({'msg': 'ok'}), 200
-
-# PUT (UPDATE) 1 PLANET
-@app.route('/planets/<int:planet_id>', methods=['PUT'])
-def update_planet(planet_id):
-
-    # SQL Equiv. = SELECT * FROM Planets where ID = 1
-    planet = Planets.query.get(planet_id)
-    # Handle errors
-    if planet is None:
-        return jsonify({'error': 'The planet with id {} doesn\'t exist'.format(planet_id)}), 400
-
-    # Extract JSON data
-    body = request.get_json(silent=True)
-    # Handle errors
-    if body is None:
-        return jsonify({'error': 'You must send information with the body'}), 400
-    # Update relevant categories
-    if "name" in body:
-        planet.name = body['name']
-    if "diameter" in body:
-        planet.diameter = body['diameter']
-    if "rotation_period" in body:
-        planet.rotation_period = body['rotation_period']
-    if "orbital_period" in body:
-        planet.orbital_period = body['orbital_period']
-    if "population" in body:
-        planet.population = body['population']
-    if "surface_water" in body:
-        planet.surface_water = body['surface_water']
-    if "climate" in body:
-        planet.climate = body['climate']
-    if "terrain" in body:
-        planet.terrain = body['terrain']
-
-    db.session.commit()
-    return jsonify({'msg': 'ok'}), 200
-
-# DELETE 1 PLANET
-@app.route('/planets/<int:planet_id>', methods=['DELETE'])
-def delete_planet(planet_id):
-    planet = Planets.query.get(planet_id)
-
-    # Handle errors
-    if planet is None:
-        return jsonify({'error': 'The planet with id {} doesn\'t exist'.format(planet_id)}), 400
-
-    db.session.delete(planet)
-    db.session.commit()
-    return jsonify({'msg': 'ok'}), 200
-
-
-# ### ENDPOINTS "/vehicles" ###
-
-# GET 1 VEHICLE (DYNAMIC URL)
-@app.route('/vehicles/<int:vehicle_id>', methods=['GET'])
-def handle_oneVehicle(vehicle_id):  # vehicles_id = <int: vehicles_id>
-    # SQL Equiv. = SELECT * FROM vehicles where ID = 1
-    vehicles = Vehicles.query.get(vehicle_id)
-    # Handle errors
-    if vehicles is None:
-        return jsonify({'error': 'The vehicles with id {} doesn\'t exist'.format(vehicle_id)}), 400
-    vehicles_serialized = vehicles.serialize()
-    return jsonify({'msg': 'ok', 'info': vehicles_serialized}), 200
-
-# GET ALL VEHICLES
-@app.route('/vehicles', methods=['GET'])
-def handle_manyVehicles():
-    vehicles = Vehicles.query.all()  # SQL Equiv. = SELECT * FROM User
-    vehicles_serialized = list(map(lambda x: x.serialize(), vehicles))
-    return jsonify({'msg': 'ok', 'info': vehicles_serialized})
-
-# POST (CREATE) 1 VEHICLE
-@app.route('/vehicles', methods=['POST'])
-def create_vehicle():
-    # Extract JSON data
-    body = request.get_json(silent=True)
-    # Handle errors
-    if body is None:
-        return jsonify({'error': 'You must send information with the body'}), 400
-    if 'name' not in body:
-        return jsonify({'error': 'You must give the vehicle a name'}), 400
-
-    # SQL Equiv. = INSERT INTO planet(name, ...) VALUES ('example', ...)
-    new_vehicle = Vehicles()
-    new_vehicle.name = body['name']
-    new_vehicle.model = body['model']
-    new_vehicle.vehicle_class = body['vehicle_class']
-    new_vehicle.manufacturer = body['manufacturer']
-    new_vehicle.consumables = body['consumables']
-    new_vehicle.cost_in_credits = body['cost_in_credits']
-    new_vehicle.crew = body['crew']
-    new_vehicle.length = body['length']
-    new_vehicle.max_atmosphering_speed = body['max_atmosphering_speed']
-    new_vehicle.cargo_capacity = body['cargo_capacity']
-
-    db.session.add(new_vehicle)  # adds new user to db
-    db.session.commit()  # like git commit, saves changes
-
-    return jsonify({'msg': 'ok'}), 200
-
-# PUT (UPDATE) 1 VEHICLE
-@app.route('/vehicles/<int:vehicle_id>', methods=['PUT'])
-def update_vehicle(vehicle_id):
-
-    # SQL Equiv. = SELECT * FROM Planets where ID = 1
-    vehicle = Vehicles.query.get(vehicle_id)
-    # Handle errors
-    if vehicle is None:
-        return jsonify({'error': 'The vehicle with id {} doesn\'t exist'.format(vehicle_id)}), 400
-
-    # Extract JSON data
-    body = request.get_json(silent=True)
-    # Handle errors
-    if body is None:
-        return jsonify({'error': 'You must send information with the body'}), 400
-    # Update relevant categories
-    if "name" in body:
-        vehicle.name = body['name']
-    if "model" in body:
-        vehicle.model = body['model']
-    if "vehicles_class" in body:
-        vehicle.vehicles_class = body['vehicles_class']
-    if "manufacturer" in body:
-        vehicle.manufacturer = body['manufacturer']
-    if "consumables" in body:
-        vehicle.consumables = body['consumables']
-    if "cost_in_credits" in body:
-        vehicle.cost_in_credits = body['cost_in_credits']
-    if "crew" in body:
-        vehicle.crew = body['crew']
-    if "length" in body:
-        vehicle.length = body['length']
-    if "max_atmosphering_speed" in body:
-        vehicle.max_atmosphering_speed = body['max_atmosphering_speed']
-    if "cargo_capacity" in body:
-        vehicle.cargo_capacity = body['cargo_capacity']
-
-    db.session.commit()
-    return jsonify({'msg': 'ok'}), 200
-
-# DELETE 1 VEHICLE
-@app.route('/vehicles/<int:vehicle_id>', methods=['DELETE'])
-def delete_vehicle(vehicle_id):
-    vehicle = Vehicles.query.get(vehicle_id)
-
-    # Handle errors
-    if vehicle is None:
-        return jsonify({'error': 'The vehicle with id {} doesn\'t exist'.format(vehicle_id)}), 400
-
-    db.session.delete(vehicle)
-    db.session.commit()
-    return jsonify({'msg': 'ok'}), 200
+    # imported from utils -> lists urls and returns page content (built once, see cached_page)
+    return cached_page(current_app, 'html', generate_sitemap)
 
+# Same list of endpoints in JSON (with their methods) for programs #
+@api.route('/routes')
+def route_index():
+    return json_response({'routes': cached_page(current_app, 'json', generate_route_index)})
 
-# ### ENDPOINTS "/characters" ###
+# Prometheus metrics of this API (requests, latency, in-flight, db pool...) #
+@api.route('/metrics')
+def metrics():
+    return metrics_response()
 
-# GET 1 CHARACTER (DYNAMIC URL)
-@app.route('/characters/<int:character_id>', methods=['GET'])
-def handle_oneCharacter(character_id):  # characters_id = <int: characters_id>
-    # SQL Equiv. = SELECT * FROM characters where ID = 1
-    characters = Characters.query.get(character_id)
-    # Handle errors
-    if characters is None:
-        return jsonify({'error': 'The characters with id {} doesn\'t exist'.format(character_id)}), 400
-    characters_serialized = characters.serialize()
-    return jsonify({'msg': 'ok', 'info': characters_serialized}), 200
-
-# GET ALL CHARACTERS
-@app.route('/characters', methods=['GET'])
-def handle_manyCharacter():
-    characters = Characters.query.all()  # SQL Equiv. = SELECT * FROM User
-    characters_serialized = list(map(lambda x: x.serialize(), characters))
-    return jsonify({'msg': 'ok', 'info': characters_serialized})
-
-
-# POST (CREATE) 1 CHARACTER
-@app.route('/characters', methods=['POST'])
-def create_character():
-    # Extract JSON data
-    body = request.get_json(silent=True)
-    # Handle errors
-    if body is None:
-        return jsonify({'error': 'You must send information with the body'}), 400
-    if 'name' not in body:
-        return jsonify({'error': 'You must give the character a name'}), 400
-
-    # SQL Equiv. = INSERT INTO character(name, ...) VALUES ('example', ...)
-    new_character = Characters()
-    new_character.name = body['name']
-    new_character.gender = body['gender']
-    new_character.height = body['height']
-    new_character.mass = body['mass']
-    new_character.hair_color = body['hair_color']
-    new_character.eye_color = body['eye_color']
-    new_character.birth_year = body['birth_year']
-
-    db.session.add(new_character)  # adds new user to db
-    db.session.commit()  # like git commit, saves changes
-
-    return jsonify({'msg': 'ok'}), 200
-
-# PUT (UPDATE) 1 CHARACTER
-@app.route('/characters/<int:character_id>', methods=['PUT'])
-def update_character(character_id):
-
-    # SQL Equiv. = SELECT * FROM Planets where ID = 1
-    character = Characters.query.get(character_id)
-    # Handle errors
-    if character is None:
-        return jsonify({'error': 'The character with id {} doesn\'t exist'.format(character_id)}), 400
 
-    # Extract JSON data
-    body = request.get_json(silent=True)
-    # Handle errors
-    if body is None:
-        return jsonify({'error': 'You must send information with the body'}), 400
-    # Update relevant categories
-    if "name" in body:
-        character.name = body['name']
-    if "gender" in body:
-        character.gender = body['gender']
-    if "height" in body:
-        character.height = body['height']
-    if "mass" in body:
-        character.mass = body['mass']
-    if "hair_color" in body:
-        character.hair_color = body['hair_color']
-    if "eye_color" in body:
-        character.eye_color = body['eye_color']
-    if "birth_year" in body:
-        character.birth_year = body['birth_year']
+# ### ENDPOINTS "/users", "/planets", "/vehicles", "/characters" ###
 
-    db.session.commit()
-    return jsonify({'msg': 'ok'}), 200
+# GET 1, GET ALL, POST, POST /bulk, PUT and DELETE of each table, made from the model (see resources.py)
+for resource in RESOURCES:
+    resource.register(api)
 
-# DELETE 1 CHARACTER
-@app.route('/characters/<int:character_id>', methods=['DELETE'])
-def delete_character(character_id):
-    character = Characters.query.get(character_id)
 
-    # Handle errors
-    if character is None:
-        return jsonify({'error': 'The character with id {} doesn\'t exist'.format(character_id)}), 400
+# ### ENDPOINT "/search" ###
 
-    db.session.delete(character)
-    db.session.commit()
-    return jsonify({'msg': 'ok'}), 200
+# SEARCH CHARACTERS, PLANETS AND VEHICLES BY NAME (typeahead)
+@api.route('/search', methods=['GET'])
+@cached_response('characters', 'planets', 'vehicles')  # cached until 1 of them changes (see response_cache.py)
+def handle_search():
+    # /search?q=hot&limit=5 -> names (or a word of them) that start with 'hot', best first (see search.py)
+    query, limit = get_search_args()
+    results = search_catalog(query, limit)
+    return json_response({'msg': 'ok', 'results': results})
 
 
 # ### ENDPOINTS "/favorites" ###
 
 # GET 1 USER FAVS
-@app.route('/users/<int:user_id>/favorites', methods=['GET'])
+@api.route('/users/<int:user_id>/favorites', methods=['GET'])
 def handle_userFavs(user_id):  # user_id = <int: user_id>
 
     # SQL Equiv. = SELECT * FROM Users where ID = 1
@@ -453,76 +125,37 @@ def handle_userFavs(user_id):  # user_id = <int: user_id>
     if user is None:
         return jsonify({'error': 'The user with id {} doesn\'t exist'.format(user_id)}), 400
 
-    # SQL Equiv. = SELECT * FROM favorite_x where user_id = 1
-    # Characters
-    favorite_characters = db.session.query(Favorite_Characters, Characters).join(Characters).filter(Favorite_Characters.user_id == user_id).all()
-    favorite_characters_serialized = []
-    for favorite_item, character_item in favorite_characters:
-        favorite_characters_serialized.append({'favorite_character_id': favorite_item.id,'character_info': character_item.serialize()})
-    # Planets
-    favorite_planets = db.session.query(Favorite_Planets, Planets).join(Planets).filter(Favorite_Planets.user_id == user_id).all()
-    favorite_planets_serialized = []
-    for favorite_item, planet_item in favorite_planets:
-        favorite_planets_serialized.append({'favorite_planet_id': favorite_item.id,'planet_info': planet_item.serialize()})
-    # Vehicles
-    favorite_vehicles = db.session.query(Favorite_Vehicles, Vehicles).join(Vehicles).filter(Favorite_Vehicles.user_id == user_id).all()
-    favorite_vehicles_serialized = []
-    for favorite_item, vehicle_item in favorite_vehicles:
-        favorite_vehicles_serialized.append({'favorite_vehicle_id': favorite_item.id,'vehicle_info': vehicle_item.serialize()})
-
-    favorites_object = {"characters": favorite_characters_serialized,
-                        "planets": favorite_planets_serialized,
-                        "vehicles": favorite_vehicles_serialized}
+    # SQL Equiv. = SELECT * FROM favorite_x where user_id = 1 (see favorites.py), ?fields= for the planets, vehicles...
+    favorites_object = get_user_favorites(user_id, fields=get_favorite_fields())
 
     return jsonify({'msg': 'ok', 'user': user.serialize(), 'user_favorites': favorites_object}), 200
 
 # GET ALL USER FAVS
-@app.route('/users/favorites', methods=['GET'])
+@api.route('/users/favorites', methods=['GET'])
 def handle_allUserFavs():  # user_id = <int: user_id>
 
+    # ?format=ndjson -> stream 1 user per line, reading the users in chunks (see favorites.py)
+    if wants_ndjson():
+        return ndjson_response(iter_users_favorites(fields=get_favorite_fields()))
+
+    # ?fields= for the planets, vehicles... (check it before reading anything)
+    fields = get_favorite_fields()
     # SQL Equiv. = SELECT * FROM Users
     users = Users.query.all()
-    users_favorites = []
+    # SQL Equivalent = SELECT * FROM favorite_x -> 3 queries in total, grouped by user_id
+    all_favorites = get_favorites(fields=fields, info_keys=ALL_USERS_INFO_KEYS)
 
-    for user in users:  
-        user_id = user.id
-        user_favs = {
+    users_favorites = []
+    for user in users:
+        users_favorites.append({
             'user_info': user.serialize(),
-            'favorites': {
-                'characters': [],
-                'planets': [],
-                'vehicles': []
-            }
-        }
-
-     # SQL Equivalent = SELECT * FROM favorite_x where user_id = <user_id>
-        favorite_characters = db.session.query(Favorite_Characters, Characters).join(Characters).filter(Favorite_Characters.user_id == user_id).all()
-        for favorite_item, character_item in favorite_characters:
-            user_favs['favorites']['characters'].append({
-                'favorite_character_id': favorite_item.id,
-                'character_info': character_item.serialize()
-            })
-
-        favorite_planets = db.session.query(Favorite_Planets, Planets).join(Planets).filter(Favorite_Planets.user_id == user_id).all()
-        for favorite_item, planet_item in favorite_planets:
-            user_favs['favorites']['planets'].append({
-                'favorite_planet_id': favorite_item.id,
-                'favorite_planet': planet_item.serialize()
-            })
-
-        favorite_vehicles = db.session.query(Favorite_Vehicles, Vehicles).join(Vehicles).filter(Favorite_Vehicles.user_id == user_id).all()
-        for favorite_item, vehicle_item in favorite_vehicles:
-            user_favs['favorites']['vehicles'].append({
-                'favorite_vehicle_id': favorite_item.id,
-                'vehicle_info': vehicle_item.serialize()
-            })
-
-        users_favorites.append(user_favs)
+            'favorites': all_favorites.get(user.id, empty_favorites())
+        })
 
     return jsonify({'msg': 'ok', 'users_favorites': users_favorites}), 200
 
 # POST (CREATE) NEW USER FAV CHARACTER
-@app.route('/users/<int:user_id>/favorites/character', methods=['POST'])
+@api.route('/users/<int:user_id>/favorites/character', methods=['POST'])
 def handle_addCharToUserFavs(user_id):  # user_id = <int: user_id>
 
     # 1. Dealing with incoming JSON
@@ -542,12 +175,10 @@ def handle_addCharToUserFavs(user_id):  # user_id = <int: user_id>
 
     # 3. Check Character is Correct
     # SQL Equiv. = SELECT * FROM Characters where character name = body['character_name']
-    favorite_character = Characters.query.filter_by(name=body['character_name']).first()
-    if favorite_character is None:
+    # (name -> id is cached in this worker, see caching.py)
+    favorite_character_id = get_id_by_name(Characters, body['character_name'])
+    if favorite_character_id is None:
         return jsonify({'error': 'You must specify an exisiting character'}), 400
-    
-    # once checked, now need to get character's id in order to add it to Favorite_Characters table
-    favorite_character_id = favorite_character.id
 
     # 4. Now all is correct, add this character to user's list of favorite characters 
     new_fav_character = Favorite_Characters()
@@ -555,18 +186,24 @@ def handle_addCharToUserFavs(user_id):  # user_id = <int: user_id>
     new_fav_character.character_id = favorite_character_id
 
     db.session.add(new_fav_character)  # adds to db
-    db.session.commit()  # like git commit, saves changes
+    try:
+        db.session.commit()  # like git commit, saves changes
+    except IntegrityError as error:
+        db.session.rollback()
+        if is_unique_violation(error):  # unique (user_id, character_id) -> it's already a favorite
+            return jsonify({'error': 'This user already has this character as a favorite'}), 400
+        # foreign key: the character (its id can come from the name cache of this worker, see caching.py) or the user
+        # was deleted in the meantime
+        name_cache(Characters).clear()
+        return jsonify({'error': 'This character or this user doesn\'t exist anymore'}), 400
     
     # For JSON Reply
-    favorite_characters = db.session.query(Favorite_Characters, Characters).join(Characters).filter(Favorite_Characters.user_id == user_id).all()
-    favorite_characters_serialized = []
-    for favorite_item, character_item in favorite_characters:
-        favorite_characters_serialized.append({'favorite_character_id': favorite_item.id,'character_info': character_item.serialize()})
+    favorite_characters_serialized = get_user_favorites(user_id, ['characters'])['characters']
 
     return jsonify({'msg': 'Favorite added', 'Favorite_Characters': favorite_characters_serialized}), 200
    
 # POST (CREATE) NEW USER FAV PLANET
-@app.route('/users/<int:user_id>/favorites/planet', methods=['POST'])
+@api.route('/users/<int:user_id>/favorites/planet', methods=['POST'])
 def handle_addPlanetToUserFavs(user_id):  # user_id = <int: user_id>
 
     # 1. Dealing with incoming JSON
@@ -586,12 +223,10 @@ def handle_addPlanetToUserFavs(user_id):  # user_id = <int: user_id>
 
     # 3. Check Planet is Correct
     # SQL Equiv. = SELECT * FROM Planets where planet name = body['planet_name']
-    favorite_planet = Planets.query.filter_by(name=body['planet_name']).first()
-    if favorite_planet is None:
+    # (name -> id is cached in this worker, see caching.py)
+    favorite_planet_id = get_id_by_name(Planets, body['planet_name'])
+    if favorite_planet_id is None:
         return jsonify({'error': 'You must specify an exisiting planet'}), 400
-    
-    # once checked, now need to get planet's id in order to add it to Favorite_Planets table
-    favorite_planet_id = favorite_planet.id
 
     # 4. Now all is correct, add this planet to user's list of favorite planets 
     new_fav_planet = Favorite_Planets()
@@ -599,18 +234,24 @@ def handle_addPlanetToUserFavs(user_id):  # user_id = <int: user_id>
     new_fav_planet.planet_id = favorite_planet_id
 
     db.session.add(new_fav_planet)  # adds to db
-    db.session.commit()  # like git commit, saves changes
+    try:
+        db.session.commit()  # like git commit, saves changes
+    except IntegrityError as error:
+        db.session.rollback()
+        if is_unique_violation(error):  # unique (user_id, planet_id) -> it's already a favorite
+            return jsonify({'error': 'This user already has this planet as a favorite'}), 400
+        # foreign key: the planet (its id can come from the name cache of this worker, see caching.py) or the user
+        # was deleted in the meantime
+        name_cache(Planets).clear()
+        return jsonify({'error': 'This planet or this user doesn\'t exist anymore'}), 400
     
     # For JSON Reply
-    favorite_planets = db.session.query(Favorite_Planets, Planets).join(Planets).filter(Favorite_Planets.user_id == user_id).all()
-    favorite_planets_serialized = []
-    for favorite_item, planet_item in favorite_planets:
-        favorite_planets_serialized.append({'favorite_planet_id': favorite_item.id,'planet_info': planet_item.serialize()})
+    favorite_planets_serialized = get_user_favorites(user_id, ['planets'])['planets']
 
     return jsonify({'msg': 'Favorite added', 'Favorite_Planets': favorite_planets_serialized}), 200
    
 # POST (CREATE) NEW USER FAV VEHICLE
-@app.route('/users/<int:user_id>/favorites/vehicle', methods=['POST'])
+@api.route('/users/<int:user_id>/favorites/vehicle', methods=['POST'])
 def handle_addVehicleToUserFavs(user_id):  # user_id = <int: user_id>
 
     # 1. Dealing with incoming JSON
@@ -630,12 +271,10 @@ def handle_addVehicleToUserFavs(user_id):  # user_id = <int: user_id>
 
     # 3. Check Vehicle is Correct
     # SQL Equiv. = SELECT * FROM Planets where vehicle name = body['vehicle_name']
-    favorite_vehicle = Vehicles.query.filter_by(name=body['vehicle_name']).first()
-    if favorite_vehicle is None:
+    # (name -> id is cached in this worker, see caching.py)
+    favorite_vehicle_id = get_id_by_name(Vehicles, body['vehicle_name'])
+    if favorite_vehicle_id is None:
         return jsonify({'error': 'You must specify an exisiting vehicle'}), 400
-    
-    # once checked, now need to get vehicle's id in order to add it to Favorite_Planets table
-    favorite_vehicle_id = favorite_vehicle.id
 
     # 4. Now all is correct, add this vehicle to user's list of favorite vehicles 
     new_fav_vehicle = Favorite_Vehicles()
@@ -643,18 +282,57 @@ def handle_addVehicleToUserFavs(user_id):  # user_id = <int: user_id>
     new_fav_vehicle.vehicle_id = favorite_vehicle_id
 
     db.session.add(new_fav_vehicle)  # adds to db
-    db.session.commit()  # like git commit, saves changes
+    try:
+        db.session.commit()  # like git commit, saves changes
+    except IntegrityError as error:
+        db.session.rollback()
+        if is_unique_violation(error):  # unique (user_id, vehicle_id) -> it's already a favorite
+            return jsonify({'error': 'This user already has this vehicle as a favorite'}), 400
+        # foreign key: the vehicle (its id can come from the name cache of this worker, see caching.py) or the user
+        # was deleted in the meantime
+        name_cache(Vehicles).clear()
+        return jsonify({'error': 'This vehicle or this user doesn\'t exist anymore'}), 400
     
     # For JSON Reply
-    favorite_vehicles = db.session.query(Favorite_Vehicles, Vehicles).join(Vehicles).filter(Favorite_Vehicles.user_id == user_id).all()
-    favorite_vehicles_serialized = []
-    for favorite_item, vehicle_item in favorite_vehicles:
-        favorite_vehicles_serialized.append({'favorite_vehicle_id': favorite_item.id,'vehicle_info': vehicle_item.serialize()})
+    favorite_vehicles_serialized = get_user_favorites(user_id, ['vehicles'])['vehicles']
 
     return jsonify({'msg': 'Favorite added', 'Favorite_Vehicles': favorite_vehicles_serialized}), 200
 
+# PATCH (ADD + DELETE) MANY USER FAVS
+@api.route('/users/<int:user_id>/favorites', methods=['PATCH'])
+def handle_changeUserFavs(user_id):  # user_id = <int: user_id>
+
+    # 1. Dealing with incoming JSON
+    # body = {"add": {"planets": ["Hoth"], "characters": [...]}, "remove": {"vehicles": [...]}}
+    body = request.get_json(silent=True)
+    # Handle Errors
+    if body is None or not isinstance(body, dict):
+        return jsonify({'error': 'You must include a body in the request'}), 400
+    if 'add' not in body and 'remove' not in body:
+        return jsonify({'error': 'You must specify the favorites to "add" and/or "remove"'}), 400
+    add = body.get('add', {})
+    remove = body.get('remove', {})
+    error = check_favorite_changes(add) or check_favorite_changes(remove)
+    if error is not None:
+        return jsonify({'error': error}), 400
+
+    # 2. Check User is Correct
+    # SQL Equiv. = SELECT * FROM Users where ID = 1
+    user = Users.query.get(user_id)
+    # Handle errors
+    if user is None:
+        return jsonify({'error': 'You must specify an exisiting user'}), 400
+
+    # 3. Add + delete everything in 1 transaction (see favorites.py)
+    error = change_user_favorites(user_id, add, remove)
+    if error is not None:
+        return jsonify({'error': error}), 400
+
+    # For JSON Reply
+    return jsonify({'msg': 'Favorites updated', 'user': user.serialize(), 'user_favorites': get_user_favorites(user_id)}), 200
+
 # DELETE USER FAV CHARACTER
-@app.route('/users/<int:user_id>/favorites/character', methods=['DELETE'])
+@api.route('/users/<int:user_id>/favorites/character', methods=['DELETE'])
 def deleteUserFavChar(user_id):
 
     # 1. Dealing with incoming JSON
@@ -674,12 +352,13 @@ def deleteUserFavChar(user_id):
 
     # 3. Check Character is Correct
     # SQL Equiv. = SELECT * FROM Characters where character name = body['character_name']
-    character_to_delete = Characters.query.filter_by(name=body['character_name']).first()
-    if character_to_delete is None:
+    # (name -> id is cached in this worker, see caching.py)
+    character_to_delete_id = get_id_by_name(Characters, body['character_name'])
+    if character_to_delete_id is None:
         return jsonify({'error': 'You must specify an exisiting character'}), 400
     
     # 4. Check this user has previously favorited that Character
-    fav_character = Favorite_Characters.query.filter_by(user_id=user_id, character_id=character_to_delete.id).first()
+    fav_character = Favorite_Characters.query.filter_by(user_id=user_id, character_id=character_to_delete_id).first()
     if fav_character is None:
         return jsonify({'error': 'This user didnt favorite this character before'}), 400
 
@@ -688,19 +367,16 @@ def deleteUserFavChar(user_id):
     db.session.commit()
 
     # For JSON Reply
-    favorite_characters = db.session.query(Favorite_Characters, Characters).join(Characters).filter(Favorite_Characters.user_id == user_id).all()
-    favorite_characters_serialized = []
-    for favorite_item, character_item in favorite_characters:
-        favorite_characters_serialized.append({'favorite_character_id': favorite_item.id,'character_info': character_item.serialize()})
+    favorite_characters_serialized = get_user_favorites(user_id, ['characters'])['characters']
 
-    user_name = Users.query.filter_by(id=user_id).first().name
+    user_name = user.name  # already loaded in step 2, no need to ask the db again
 
     return jsonify({'msg': 'This character has been deleted from the users favorite characters list',
                     'user': user_name,
                     'Favorite_Characters': favorite_characters_serialized}), 200
 
 # DELETE USER FAV PLANET
-@app.route('/users/<int:user_id>/favorites/planet', methods=['DELETE'])
+@api.route('/users/<int:user_id>/favorites/planet', methods=['DELETE'])
 def deleteUserFavPlanet(user_id):
 
     # 1. Dealing with incoming JSON
@@ -720,12 +396,13 @@ def deleteUserFavPlanet(user_id):
 
     # 3. Check planet is Correct
     # SQL Equiv. = SELECT * FROM Planets where planet name = body['character_name']
-    planet_to_delete = Planets.query.filter_by(name=body['planet_name']).first()
-    if planet_to_delete is None:
+    # (name -> id is cached in this worker, see caching.py)
+    planet_to_delete_id = get_id_by_name(Planets, body['planet_name'])
+    if planet_to_delete_id is None:
         return jsonify({'error': 'You must specify an exisiting planet'}), 400
     
     # 4. Check this user has previously favorited that planet
-    fav_planet = Favorite_Planets.query.filter_by(user_id=user_id, planet_id=planet_to_delete.id).first()
+    fav_planet = Favorite_Planets.query.filter_by(user_id=user_id, planet_id=planet_to_delete_id).first()
     if fav_planet is None:
         return jsonify({'error': 'This user didnt favorite this planet before'}), 400
 
@@ -734,19 +411,16 @@ def deleteUserFavPlanet(user_id):
     db.session.commit()
 
     # For JSON Reply
-    favorite_planets = db.session.query(Favorite_Planets, Planets).join(Planets).filter(Favorite_Planets.user_id == user_id).all()
-    favorite_planets_serialized = []
-    for favorite_item, planet_item in favorite_planets:
-        favorite_planets_serialized.append({'favorite_planet_id': favorite_item.id,'planet_info': planet_item.serialize()})
+    favorite_planets_serialized = get_user_favorites(user_id, ['planets'])['planets']
 
-    user_name = Users.query.filter_by(id=user_id).first().name
+    user_name = user.name  # already loaded in step 2, no need to ask the db again
 
     return jsonify({'msg': 'This planet has been deleted from the users favorite planets list',
                     'user': user_name,
                     'Favorite_Planets': favorite_planets_serialized}), 200
 
 # DELETE USER FAV VEHICLE
-@app.route('/users/<int:user_id>/favorites/vehicle', methods=['DELETE'])
+@api.route('/users/<int:user_id>/favorites/vehicle', methods=['DELETE'])
 def deleteUserFavVehicle(user_id):
 
     # 1. Dealing with incoming JSON
@@ -766,12 +440,13 @@ def deleteUserFavVehicle(user_id):
 
     # 3. Check vehicle is Correct
     # SQL Equiv. = SELECT * FROM Vehicles where vehicle name = body['character_name']
-    vehicle_to_delete = Vehicles.query.filter_by(name=body['vehicle_name']).first()
-    if vehicle_to_delete is None:
+    # (name -> id is cached in this worker, see caching.py)
+    vehicle_to_delete_id = get_id_by_name(Vehicles, body['vehicle_name'])
+    if vehicle_to_delete_id is None:
         return jsonify({'error': 'You must specify an exisiting vehicle'}), 400
     
     # 4. Check this user has previously favorited that vehicle
-    fav_vehicle = Favorite_Vehicles.query.filter_by(user_id=user_id, vehicle_id=vehicle_to_delete.id).first()
+    fav_vehicle = Favorite_Vehicles.query.filter_by(user_id=user_id, vehicle_id=vehicle_to_delete_id).first()
     if fav_vehicle is None:
         return jsonify({'error': 'This user didnt favorite this vehicle before'}), 400
 
@@ -780,12 +455,9 @@ def deleteUserFavVehicle(user_id):
     db.session.commit()
 
     # For JSON Reply
-    favorite_vehicles = db.session.query(Favorite_Vehicles, Vehicles).join(Vehicles).filter(Favorite_Vehicles.user_id == user_id).all()
-    favorite_vehicles_serialized = []
-    for favorite_item, vehicle_item in favorite_vehicles:
-        favorite_vehicles_serialized.append({'favorite_vehicle_id': favorite_item.id,'vehicle_info': vehicle_item.serialize()})
+    favorite_vehicles_serialized = get_user_favorites(user_id, ['vehicles'])['vehicles']
 
-    user_name = Users.query.filter_by(id=user_id).first().name
+    user_name = user.name  # already loaded in step 2, no need to ask the db again
 
     return jsonify({'msg': 'This vehicle has been deleted from the users favorite vehicles list',
                     'user': user_name,
@@ -797,4 +469,4 @@ def deleteUserFavVehicle(user_id):
 if __name__ == '__main__':
     # if PORT in .env file has a value, use that value, if not use 3000
     PORT = int(os.environ.get('PORT', 3000))
-    app.run(host='0.0.0.0', port=PORT, debug=False)
+    create_app().run(host='0.0.0.0', port=PORT, debug=False)
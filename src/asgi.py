@@ -0,0 +1,127 @@
+# ASGI entry point (async), the alternative to wsgi.py:
+#   gunicorn asgi:application -k uvicorn.workers.UvicornWorker --chdir ./src/
+#   or: cd src && uvicorn asgi:application --workers 4
+#
+# GET /users/<id>/favorites (4 queries, not cached) is answered here with an async handler and an async engine
+# (asyncpg / aiosqlite): its queries run at the same time and while it waits for the db the worker keeps serving
+# the others. Same reply as Flask: compressed (compression.py), X-Query-Count, in the Prometheus metrics (metrics.py)
+# every other route goes to the normal Flask app (app.py) through WsgiToAsgi (runs in a thread), also /planets/<id>...:
+# they are in the response cache (ETag, 304), a hit there is cheaper than any db read
+# ASYNC_DATABASE_URL overrides the async url, by default it's DATABASE_URL with the async driver
+
+import os
+import re
+import time
+import asyncio
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.http import parse_accept_header
+from sqlalchemy import select
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from app import create_app
+from models import Users
+from favorites import FAVORITE_TYPES
+from pool import engine_options
+from compression import accepted_encoding, should_compress, compress
+from metrics import IN_PROGRESS, record_request
+
+ASYNC_DRIVERS = {'postgresql': 'postgresql+asyncpg', 'sqlite': 'sqlite+aiosqlite'}
+
+
+def async_database_url(database_url):
+    url = make_url(database_url)
+    return str(url.set(drivername=ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)))
+
+
+flask_app = create_app()
+ASYNC_DATABASE_URL = os.environ.get('ASYNC_DATABASE_URL') or async_database_url(flask_app.config['SQLALCHEMY_DATABASE_URI'])
+engine = create_async_engine(ASYNC_DATABASE_URL, **engine_options(ASYNC_DATABASE_URL, 'async'))
+
+
+# ### ASYNC HANDLERS: same replies as the ones in app.py -> (status code, JSON object) ###
+
+async def get_one(model, item_id):
+    # SQL Equiv. = SELECT * FROM x where ID = 1
+    async with AsyncSession(engine) as session:
+        return await session.get(model, item_id)
+
+
+async def get_favorites_of_type(fav_type, user_id):
+    # SQL Equiv. = SELECT * FROM favorite_x JOIN x where user_id = 1 (own session = own connection)
+    favorite_model, item_model, id_key, info_key, item_id_column = FAVORITE_TYPES[fav_type]
+    async with AsyncSession(engine) as session:
+        rows = await session.execute(select(favorite_model, item_model).join(item_model)
+                                     .where(favorite_model.user_id == user_id).order_by(favorite_model.id))
+        return [{id_key: favorite_item.id, info_key: item.serialize()} for favorite_item, item in rows]
+
+
+async def handle_userFavs(user_id):
+    # the user + the 3 favorite queries run at the same time -> as slow as the slowest one, not the sum
+    user, *favorites = await asyncio.gather(get_one(Users, user_id),
+                                            *(get_favorites_of_type(fav_type, user_id) for fav_type in FAVORITE_TYPES))
+    # Handle errors
+    if user is None:
+        return 400, {'error': 'The user with id {} doesn\'t exist'.format(user_id)}
+    return 200, {'msg': 'ok', 'user': user.serialize(), 'user_favorites': dict(zip(FAVORITE_TYPES, favorites))}
+
+
+# GET routes answered here (without ?fields= or other query string), the rest goes to Flask
+# (url, Flask endpoint name for the metrics, handler, queries it runs -> X-Query-Count)
+ROUTES = [
+    (re.compile(r'^/users/(\d+)/favorites/?$'), 'api.handle_userFavs', handle_userFavs, 1 + len(FAVORITE_TYPES)),
+]
+
+flask_asgi = WsgiToAsgi(flask_app)
+
+
+async def send_json(scope, send, status, payload, query_count):
+    # same bytes as jsonify() in app.py, same headers as the after_request functions of Flask
+    # returns the size of the body that was sent
+    body = (flask_app.json.dumps(payload, separators=(',', ':')) + '\n').encode()
+    request_headers = {name: value.decode('latin-1') for name, value in scope['headers']}
+    headers = [(b'content-type', b'application/json'), (b'vary', b'Accept-Encoding'),
+               (b'x-query-count', str(query_count).encode())]
+    encoding = accepted_encoding(parse_accept_header(request_headers.get(b'accept-encoding')))
+    if encoding is not None and should_compress('application/json', len(body)):
+        body = compress(body, encoding)
+        headers.append((b'content-encoding', encoding.encode()))
+    headers.append((b'content-length', str(len(body)).encode()))
+    if b'origin' in request_headers:
+        headers.append((b'access-control-allow-origin', b'*'))  # like flask_cors in app.py
+    await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+    await send({'type': 'http.response.body', 'body': body})
+    return len(body)
+
+
+async def answer(scope, send, endpoint, handler, query_count, item_id):
+    # the metrics of setup_metrics() (metrics.py) for a request Flask doesn't see
+    start = time.perf_counter()
+    IN_PROGRESS.labels(endpoint).inc()
+    try:
+        status, payload = await handler(item_id)
+        size = await send_json(scope, send, status, payload, query_count)
+        record_request(endpoint, scope['method'], status, start, size)
+    finally:
+        IN_PROGRESS.labels(endpoint).dec()
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            await engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await lifespan(receive, send)
+    if scope['type'] == 'http' and scope['method'] == 'GET' and not scope['query_string']:
+        for pattern, endpoint, handler, query_count in ROUTES:
+            match = pattern.match(scope['path'])
+            if match:
+                return await answer(scope, send, endpoint, handler, query_count, int(match.group(1)))
+    await flask_asgi(scope, receive, send)
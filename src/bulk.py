@@ -0,0 +1,152 @@
+import json
+from flask import request, jsonify
+from sqlalchemy import bindparam
+from sqlalchemy.exc import SQLAlchemyError
+from models import db
+
+# POST /<resource>/bulk -> create MANY rows in 1 request
+# body = a JSON array [{...}, {...}] or NDJSON (1 object per line, 'Content-Type: application/x-ndjson')
+# ?upsert=true -> if a row with the same name (email for users) exists, update it instead of adding a new one
+# rows are inserted BATCH_SIZE at a time with 1 executemany per batch and 1 transaction (commit) per batch
+# every row that fails is reported in 'errors' with its position, the rest are still saved
+# (if the db still refuses a batch, its rows are saved again 1 by 1 to find the bad ones)
+
+BATCH_SIZE = 1000
+
+
+def read_bulk_body():
+    # returns a list of rows or None if the body can't be read
+    if request.mimetype == 'application/x-ndjson':
+        try:
+            return [json.loads(line) for line in request.get_data(as_text=True).splitlines() if line.strip()]
+        except ValueError:
+            return None
+    body = request.get_json(silent=True)
+    return body if isinstance(body, list) else None
+
+
+def bulk_create(model, upsert_key='name', unique=False):
+    # unique=True -> upsert_key can't be repeated (e.g. users email), without ?upsert those rows are errors
+    rows = read_bulk_body()
+    if rows is None:
+        return jsonify({'error': 'You must send a list of objects in the body (JSON array or NDJSON)'}), 400
+
+    upsert = request.args.get('upsert', 'false').lower() in ('1', 'true', 'yes')
+    columns = set(model.__table__.columns.keys()) - {'id'}
+    # NOT NULL columns: a row can't set them to null
+    required = {column.name for column in model.__table__.columns if not column.nullable and not column.primary_key}
+    result = {'created': 0, 'updated': 0, 'errors': []}
+
+    for start in range(0, len(rows), BATCH_SIZE):
+        save_batch(model, rows[start:start + BATCH_SIZE], start, columns, required, upsert_key, unique, upsert, result)
+    result['errors'].sort(key=lambda error: error['row'])
+
+    return jsonify({'msg': 'ok', **result}), 200
+
+
+def check_values(row, required):
+    # returns the error message of the values of the row or None if they are ok (same checks as check_body)
+    for column in sorted(required):
+        if column in row and row[column] is None:
+            return 'The {} can\'t be empty'.format(column)
+    for column, value in sorted(row.items()):
+        # [...] or {...} can't go in a column (the db would refuse the whole batch)
+        if isinstance(value, (list, dict)):
+            return 'The {} must be a text or a number'.format(column)
+    return None
+
+
+def save_batch(model, batch, start, columns, required, upsert_key, unique, upsert, result):
+    # 1. Check every row, keep the good ones by their upsert key (last one wins inside the batch)
+    new_rows = []
+    rows_by_key = {}
+    for position, row in enumerate(batch, start):
+        if not isinstance(row, dict):
+            result['errors'].append({'row': position, 'error': 'Each row must be an object'})
+            continue
+        if row.get('name') is None:  # missing or null, like in create_x
+            result['errors'].append({'row': position, 'error': 'You must give the row a name'})
+            continue
+        unknown = set(row) - columns
+        if unknown:
+            result['errors'].append({'row': position, 'error': 'Unknown fields: {}'.format(', '.join(sorted(unknown)))})
+            continue
+
+        if (upsert or unique) and upsert_key not in row:
+            result['errors'].append({'row': position, 'error': 'You must give the row a {}'.format(upsert_key)})
+            continue
+
+        key = row.get(upsert_key)
+        # the key goes in a dict below: [...] or {...} can't (and isn't a valid name / email anyway)
+        if (upsert or unique) and not isinstance(key, str):
+            result['errors'].append({'row': position, 'error': 'The {} must be a text'.format(upsert_key)})
+            continue
+        error = check_values(row, required)
+        if error is not None:
+            result['errors'].append({'row': position, 'error': error})
+            continue
+        if (upsert or unique) and key in rows_by_key:
+            if not upsert:
+                result['errors'].append({'row': position, 'error': 'This {} is repeated in the list'.format(upsert_key)})
+                continue
+            rows_by_key[key][1].update(row)
+            continue
+        if upsert or unique:
+            rows_by_key[key] = (position, dict(row))
+        else:
+            new_rows.append((position, row))
+
+    # 2. Find the rows that already exist with 1 query
+    # SQL Equiv. = SELECT name, id FROM x WHERE name IN ('a', 'b', ...)
+    existing = {}
+    if rows_by_key:
+        key_column = getattr(model, upsert_key)
+        existing = dict(db.session.query(key_column, model.id).filter(key_column.in_(list(rows_by_key))).all())
+
+    # updates only touch the fields that were sent -> 1 executemany per group of rows with the same fields
+    update_groups = {}
+    for key, (position, row) in rows_by_key.items():
+        if key not in existing:
+            new_rows.append((position, row))
+        elif upsert:
+            update_groups.setdefault(tuple(sorted(row)), []).append((position, {**row, '_id': existing[key]}))
+        else:
+            result['errors'].append({'row': position, 'error': 'This {} already exists'.format(upsert_key)})
+
+    # 3. Save the whole batch in 1 transaction
+    # SQL Equiv. = INSERT INTO x (name, ...) VALUES (...), (...) / UPDATE x SET ... WHERE id = ...
+    try:
+        write_rows(model.__table__, columns, new_rows, update_groups.values())
+        db.session.commit()
+    except SQLAlchemyError:
+        db.session.rollback()
+        # something the checks of step 1 don't see (a text in a number column on postgres...):
+        # 1 transaction per row, so only the bad ones fail
+        save_one_by_one(model.__table__, columns, new_rows, update_groups.values(), result)
+        return
+
+    result['created'] += len(new_rows)
+    result['updated'] += sum(len(group) for group in update_groups.values())
+
+
+def write_rows(table, columns, new_rows, update_groups):
+    if new_rows:
+        # missing fields are saved as NULL, like in create_x
+        db.session.execute(table.insert(), [{column: row.get(column) for column in columns} for position, row in new_rows])
+    for group in update_groups:
+        # the SET clause is built from the keys of the rows (= fields)
+        db.session.execute(table.update().where(table.c.id == bindparam('_id')), [values for position, values in group])
+
+
+def save_one_by_one(table, columns, new_rows, update_groups, result):
+    rows = [(position, [(position, row)], []) for position, row in new_rows]
+    rows += [(position, [], [[(position, values)]]) for group in update_groups for position, values in group]
+    for position, new_row, update_group in sorted(rows, key=lambda row: row[0]):
+        try:
+            write_rows(table, columns, new_row, update_group)
+            db.session.commit()
+        except SQLAlchemyError as error:
+            db.session.rollback()
+            result['errors'].append({'row': position, 'error': 'The row could not be saved: {}'.format(error.__class__.__name__)})
+            continue
+        result['created' if new_row else 'updated'] += 1
@@ -0,0 +1,131 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from itertools import chain
+from sqlalchemy import event
+from models import db
+
+# In-process caches (1 per gunicorn worker) + the tool to empty them when the db changes
+# -> after a COMMIT that touched a table, every function registered with on_table_change(table) is called
+
+
+class LRUCache:
+    # keeps the 'max_size' most recently used keys, each one lives 'ttl' seconds (None = forever)
+    def __init__(self, max_size=1024, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.items = OrderedDict()  # key -> (expires at, value)
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return default
+            if item[0] is not None and item[0] < time.monotonic():
+                del self.items[key]
+                return default
+            self.items.move_to_end(key)  # most recently used goes last
+            return item[1]
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self.lock:
+            self.items[key] = (expires, value)
+            self.items.move_to_end(key)
+            while len(self.items) > self.max_size:
+                self.items.popitem(last=False)  # drop the least recently used
+
+    def delete(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+    def __len__(self):
+        return len(self.items)
+
+
+# ### INVALIDATION: table name -> functions to call after a commit that changed it ###
+
+TABLE_LISTENERS = {}
+
+
+def on_table_change(table_name, callback):
+    TABLE_LISTENERS.setdefault(table_name, []).append(callback)
+
+
+def changed_tables(session):
+    return session.info.setdefault('changed_tables', set())
+
+
+@event.listens_for(db.session, 'after_flush')
+def track_flushed_objects(session, flush_context):
+    # db.session.add(...) / obj.name = ... / db.session.delete(...)
+    for obj in chain(session.new, session.dirty, session.deleted):
+        changed_tables(session).add(obj.__table__.name)
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def track_statements(orm_execute_state):
+    # db.session.execute(insert/update/delete) and query.delete() / query.update()
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        changed_tables(orm_execute_state.session).add(orm_execute_state.statement.table.name)
+
+
+@event.listens_for(db.session, 'after_commit')
+def run_table_listeners(session):
+    for table_name in session.info.pop('changed_tables', ()):
+        for callback in TABLE_LISTENERS.get(table_name, ()):
+            callback()
+
+
+@event.listens_for(db.session, 'after_rollback')
+def forget_changes(session):
+    session.info.pop('changed_tables', None)
+
+
+# ### NAME -> ID CACHE for Characters, Planets and Vehicles ###
+# the catalogs almost never change, so the favorite handlers don't need to ask the db every time
+# TTL = how stale another worker's cache can be (each worker only sees its own commits)
+
+NAME_CACHE_SIZE = int(os.environ.get('NAME_CACHE_SIZE', 10000))
+NAME_CACHE_TTL = float(os.environ.get('NAME_CACHE_TTL', 300))
+NAME_CACHES = {}  # table name -> LRUCache
+
+
+def name_cache(model):
+    table_name = model.__tablename__
+    if table_name not in NAME_CACHES:
+        NAME_CACHES[table_name] = LRUCache(NAME_CACHE_SIZE, NAME_CACHE_TTL)
+        on_table_change(table_name, NAME_CACHES[table_name].clear)
+    return NAME_CACHES[table_name]
+
+
+def get_ids_by_names(model, names):
+    # returns {name: id} for the names that exist, only the ones not in the cache go to the db
+    cache = name_cache(model)
+    ids_by_name = {}
+    missing = set()
+    for name in names:
+        cached_id = cache.get(name)
+        if cached_id is None:
+            missing.add(name)
+        else:
+            ids_by_name[name] = cached_id
+
+    if missing:
+        # SQL Equiv. = SELECT name, id FROM x WHERE name IN ('a', 'b', ...)
+        for name, item_id in db.session.query(model.name, model.id).filter(model.name.in_(missing)).order_by(model.id.desc()):
+            ids_by_name[name] = item_id  # if a name is repeated, the lowest id wins (like .first())
+        for name in missing & set(ids_by_name):
+            cache.set(name, ids_by_name[name])
+    return ids_by_name
+
+
+def get_id_by_name(model, name):
+    # None if nothing has that name
+    return get_ids_by_names(model, [name]).get(name)
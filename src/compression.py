@@ -0,0 +1,76 @@
+import os
+import gzip
+from flask import request
+
+try:
+    import brotli  # optional: without it we only send gzip
+except ImportError:
+    brotli = None
+
+# Compressed replies for the clients that send 'Accept-Encoding: br' or 'Accept-Encoding: gzip'
+# the JSON of the big lists repeats the same keys on every row -> usually 5-10 times smaller
+# small replies (< COMPRESS_MIN_SIZE bytes) are sent as they are: it would cost more cpu than it saves
+# the cached replies (response_cache.py) keep their compressed bytes too -> hot replies are compressed only once
+#
+# COMPRESS_LEVEL = gzip level (1 fast ... 9 small), BROTLI_QUALITY = brotli quality (0 fast ... 11 small)
+# COMPRESS_ENCODINGS = what we offer, best first (COMPRESS_ENCODINGS= -> no compression at all)
+
+COMPRESS_MIN_SIZE = int(os.environ.get('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 4))
+COMPRESS_MIMETYPES = {'application/json', 'text/html', 'text/plain', 'application/xml'}
+COMPRESS_ENCODINGS = [encoding for encoding in os.environ.get('COMPRESS_ENCODINGS', 'br,gzip').split(',')
+                      if encoding == 'gzip' or (encoding == 'br' and brotli is not None)]
+
+
+def accepted_encoding(accept_encodings=None):
+    # the encoding of COMPRESS_ENCODINGS the client likes the most ('br', 'gzip') or None = not compressed
+    # 'Accept-Encoding: gzip;q=1.0, br;q=0.5' -> 'gzip', same q -> our order
+    # accept_encodings = the parsed header when there is no Flask request (asgi.py)
+    if accept_encodings is None:
+        accept_encodings = request.accept_encodings
+    best, best_quality = None, 0
+    for encoding in COMPRESS_ENCODINGS:
+        quality = accept_encodings.quality(encoding)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def should_compress(mimetype, size):
+    return mimetype in COMPRESS_MIMETYPES and size >= COMPRESS_MIN_SIZE
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0 -> the same body always gives the same bytes (and the same ETag)
+    return gzip.compress(body, compresslevel=COMPRESS_LEVEL, mtime=0)
+
+
+def encoded_etag(etag, encoding):
+    # the gzip bytes are not the same as the plain ones, so they can't have the same strong ETag
+    return '{}-{}'.format(etag, encoding)
+
+
+def setup_compression(app):
+    # call it after setup_metrics(app): the after_request functions run in reverse order,
+    # so the metrics see the size that really goes over the network
+    @app.after_request
+    def compress_response(response):
+        # streamed replies (NDJSON) are left alone
+        if response.is_streamed or response.direct_passthrough or response.mimetype not in COMPRESS_MIMETYPES:
+            return response
+        # the reply changes with Accept-Encoding -> a proxy must not send the gzip one to everybody
+        response.vary.add('Accept-Encoding')
+        if 'Content-Encoding' in response.headers:  # already compressed (response_cache.py)
+            return response
+        encoding = accepted_encoding()
+        if encoding is None or not should_compress(response.mimetype, len(response.get_data())):
+            return response
+        response.set_data(compress(response.get_data(), encoding))
+        response.headers['Content-Encoding'] = encoding
+        etag, weak = response.get_etag()
+        if etag is not None:
+            response.set_etag(encoded_etag(etag, encoding), weak)
+        return response
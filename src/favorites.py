@@ -0,0 +1,169 @@
+import os
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.exc import IntegrityError
+from caching import get_ids_by_names, name_cache
+from utils import is_unique_violation
+from serialization import get_fields, selected_columns
+from models import db, Users, Planets, Vehicles, Characters, Favorite_Characters, Favorite_Planets, Favorite_Vehicles
+
+# Fetches favorites for MANY users at once -> 1 query per favorite type (3 in total),
+# no matter how many users we ask for, then groups the rows by user_id in python
+# (before: 3 queries PER user inside a for loop = N+1 problem)
+#
+# FAVORITES_THREADS [0]: > 0 -> the favorite types are fetched AT THE SAME TIME by a pool of this many threads,
+# each one with its own session (= its own pooled connection) -> as slow as the slowest query, not the sum of the 3
+# every request then uses up to 3 connections at once, keep DB_POOL_SIZE (see pool.py) >= 3 x threads of the worker
+
+# 'characters' -> (favorite table, catalog table, id key, info key) for the JSON reply, + the catalog id col of the favorite table
+FAVORITE_TYPES = {
+    'characters': (Favorite_Characters, Characters, 'favorite_character_id', 'character_info', 'character_id'),
+    'planets': (Favorite_Planets, Planets, 'favorite_planet_id', 'planet_info', 'planet_id'),
+    'vehicles': (Favorite_Vehicles, Vehicles, 'favorite_vehicle_id', 'vehicle_info', 'vehicle_id'),
+}
+# GET /users/favorites has always called the planet 'favorite_planet' (the other endpoints say 'planet_info')
+ALL_USERS_INFO_KEYS = {'planets': 'favorite_planet'}
+
+
+FAVORITES_THREADS = int(os.environ.get('FAVORITES_THREADS', 0))
+favorites_pool = ThreadPoolExecutor(max_workers=FAVORITES_THREADS, thread_name_prefix='favorites') if FAVORITES_THREADS > 0 else None
+
+
+def empty_favorites(fav_types=FAVORITE_TYPES):
+    return {fav_type: [] for fav_type in fav_types}
+
+
+def get_favorite_fields():
+    # ?fields=id,name for the catalog items inside the favorites (a field only has to exist in 1 of the 3 tables)
+    return get_fields(*(item_model for favorite_model, item_model, *rest in FAVORITE_TYPES.values()))
+
+
+def query_favorites(session, fav_type, user_ids, fields=None, info_keys=None):
+    # returns [(user_id, {'favorite_x_id': 1, 'x_info': {...}}), ...] of 1 favorite type
+    # info_keys = {'planets': 'favorite_planet'} -> another name than 'x_info' for the item
+    favorite_model, item_model, id_key, info_key, item_id_column = FAVORITE_TYPES[fav_type]
+    info_key = (info_keys or {}).get(fav_type, info_key)
+    item_columns = selected_columns(item_model, fields)
+    item_keys = [key for key, column in item_columns]
+
+    # SQL Equiv. = SELECT favorite_x.id, favorite_x.user_id, x.id, x.name... FROM favorite_x JOIN x WHERE favorite_x.user_id IN (1, 2, ...)
+    # (columns instead of ORM objects, only the ?fields= of x)
+    query = (session.query(favorite_model.id, favorite_model.user_id, *[column for key, column in item_columns])
+             .join(item_model, item_model.id == getattr(favorite_model, item_id_column)))
+    if user_ids is not None:
+        query = query.filter(favorite_model.user_id.in_(user_ids))
+    return [(user_id, {id_key: favorite_id, info_key: dict(zip(item_keys, item_values))})
+            for favorite_id, user_id, *item_values in query.order_by(favorite_model.id)]
+
+
+def query_favorites_in_thread(fav_type, user_ids, fields, info_keys):
+    # db.session belongs to the request (not thread safe) -> a new session of the same kind (replicas.py still works)
+    session = db.session.session_factory()
+    try:
+        return query_favorites(session, fav_type, user_ids, fields, info_keys)
+    finally:
+        session.close()
+
+
+def get_favorites(user_ids=None, fav_types=FAVORITE_TYPES, fields=None, info_keys=None):
+    # user_ids = None -> favorites of every user (no WHERE, avoids a giant IN (...) list)
+    # fields = the ?fields= of the catalog items (None = all)
+    # returns a dictionary {user_id: {'characters': [...], 'planets': [...], 'vehicles': [...]}}
+    if favorites_pool is not None and len(fav_types) > 1:
+        # copy_context -> the threads see the app, the request and g of this request (query counts, read replica)
+        futures = [favorites_pool.submit(contextvars.copy_context().run, query_favorites_in_thread, fav_type, user_ids, fields, info_keys)
+                   for fav_type in fav_types]
+        rows_by_type = zip(fav_types, [future.result() for future in futures])
+    else:
+        rows_by_type = ((fav_type, query_favorites(db.session, fav_type, user_ids, fields, info_keys)) for fav_type in fav_types)
+
+    favorites = {}
+    for fav_type, rows in rows_by_type:
+        for user_id, favorite in rows:
+            user_favs = favorites.setdefault(user_id, empty_favorites(fav_types))
+            user_favs[fav_type].append(favorite)
+    return favorites
+
+
+def get_user_favorites(user_id, fav_types=FAVORITE_TYPES, fields=None):
+    # same as above but for 1 user, e.g. get_user_favorites(1, ['planets'])['planets']
+    return get_favorites([user_id], fav_types, fields).get(user_id, empty_favorites(fav_types))
+
+
+def iter_users_favorites(chunk_size=1000, fields=None):
+    # goes through ALL the users 'chunk_size' at a time (keyset: WHERE id > last id)
+    # -> 4 queries per chunk and only 1 chunk in memory, used to stream big replies
+    last_id = 0
+    while True:
+        users = Users.query.filter(Users.id > last_id).order_by(Users.id).limit(chunk_size).all()
+        if not users:
+            return
+        chunk_favorites = get_favorites([user.id for user in users], fields=fields, info_keys=ALL_USERS_INFO_KEYS)
+        for user in users:
+            yield {'user_info': user.serialize(), 'favorites': chunk_favorites.get(user.id, empty_favorites())}
+        last_id = users[-1].id
+
+
+def check_favorite_changes(changes):
+    # changes = {'planets': ['Hoth', ...], 'characters': [...]} -> returns an error message or None
+    if not isinstance(changes, dict):
+        return 'The favorites to add/remove must be an object like {"planets": ["Hoth"]}'
+    for fav_type, names in changes.items():
+        if fav_type not in FAVORITE_TYPES:
+            return 'The favorite type {} doesn\'t exist, use: {}'.format(fav_type, ', '.join(FAVORITE_TYPES))
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            return 'The {} must be a list of names'.format(fav_type)
+    return None
+
+
+def change_user_favorites(user_id, add, remove):
+    # adds/removes MANY favorites of 1 user in 1 transaction
+    # returns an error message (and saves nothing) or None
+    try:
+        error = apply_favorite_changes(user_id, add, remove)
+        if error is not None:
+            db.session.rollback()
+            return error
+        db.session.commit()
+    except IntegrityError as error:
+        db.session.rollback()
+        if is_unique_violation(error):
+            # another request added the same favorite between our SELECT and our INSERT
+            return 'These favorites were changed by another request at the same time, try again'
+        # foreign key: an id of the name cache was deleted by another worker -> forget the cached names
+        for favorite_model, item_model, *rest in FAVORITE_TYPES.values():
+            name_cache(item_model).clear()
+        return 'Some of these favorites don\'t exist anymore'
+    return None
+
+
+def apply_favorite_changes(user_id, add, remove):
+    # per favorite type: 1 query for the names (0 if cached) + 1 for what the user already has + 1 INSERT + 1 DELETE
+    # returns an error message or None, the caller commits
+    for fav_type in FAVORITE_TYPES:
+        to_add = set(add.get(fav_type, []))
+        to_remove = set(remove.get(fav_type, []))
+        if not to_add and not to_remove:
+            continue
+        favorite_model, item_model, id_key, info_key, item_id_column = FAVORITE_TYPES[fav_type]
+
+        # SQL Equiv. = SELECT name, id FROM x WHERE name IN ('a', 'b', ...) -> only for names not cached (see caching.py)
+        ids_by_name = get_ids_by_names(item_model, to_add | to_remove)
+        missing = (to_add | to_remove) - set(ids_by_name)
+        if missing:
+            return 'These {} don\'t exist: {}'.format(fav_type, ', '.join(sorted(missing)))
+
+        # SQL Equiv. = SELECT x_id FROM favorite_x WHERE user_id = 1 AND x_id IN (...)
+        item_id = getattr(favorite_model, item_id_column)
+        item_ids = [ids_by_name[name] for name in to_add | to_remove]
+        already_favorite = {row[0] for row in db.session.query(item_id).filter(favorite_model.user_id == user_id, item_id.in_(item_ids))}
+
+        # only add what the user doesn't have yet and only remove what the user has
+        add_ids = {ids_by_name[name] for name in to_add} - already_favorite
+        remove_ids = {ids_by_name[name] for name in to_remove - to_add} & already_favorite
+        if add_ids:
+            db.session.execute(favorite_model.__table__.insert(), [{'user_id': user_id, item_id_column: new_id} for new_id in add_ids])
+        if remove_ids:
+            favorite_model.query.filter(favorite_model.user_id == user_id, item_id.in_(remove_ids)).delete(synchronize_session=False)
+
+    return None
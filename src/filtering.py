@@ -0,0 +1,92 @@
+from flask import request
+from utils import APIException
+from models import Planets, Vehicles, Characters
+from serialization import serialized_keys
+
+# Filters + sorting for the "GET ALL" catalog endpoints, e.g.
+#   /planets?climate=arid                        SQL Equiv. = WHERE climate = 'arid'
+#   /planets?population__gte=1000&population__lt=5000
+#                                                SQL Equiv. = WHERE population >= 1000 AND population < 5000
+#   /vehicles?vehicle_class__in=wheeled,starfighter
+#                                                SQL Equiv. = WHERE vehicle_class IN ('wheeled', 'starfighter')
+#   /characters?sort=-height                     SQL Equiv. = ORDER BY height DESC, id DESC
+# the values go to SQLAlchemy as parameters (never pasted in the SQL) and only these columns are allowed:
+# each one has an index (column, id) in models.py -> filters, sorting and the next pages (cursor) use it
+
+FILTER_COLUMNS = {
+    Planets: ['population', 'diameter', 'climate', 'terrain'],
+    Vehicles: ['cost_in_credits', 'crew', 'max_atmosphering_speed', 'vehicle_class'],
+    Characters: ['height', 'mass', 'gender'],
+}
+
+# ?population__gte=1000 -> 'gte'
+OPERATORS = {
+    'gt': lambda column, value: column > value,
+    'gte': lambda column, value: column >= value,
+    'lt': lambda column, value: column < value,
+    'lte': lambda column, value: column <= value,
+}
+
+
+# the biggest integer the dbs take as a parameter (BIGINT / sqlite), a bigger one is an error of the driver (500)
+MAX_INTEGER = 2 ** 63 - 1
+
+
+def parse_value(model, name, value):
+    # '1000' -> 1000 for the number columns
+    # value = a text of the url or the sort value of a cursor (see pagination.py), which can be anything JSON has
+    python_type = getattr(model, name).type.python_type
+    if python_type is str:
+        if not isinstance(value, str):
+            raise APIException('The {} must be a text, not {}'.format(name, value), status_code=400)
+        return value
+    try:
+        if isinstance(value, (bool, list, dict)):
+            raise ValueError
+        number = python_type(value)
+    except (ValueError, TypeError):
+        raise APIException('The {} must be a number, not {}'.format(name, value), status_code=400)
+    if python_type is int and not -MAX_INTEGER - 1 <= number <= MAX_INTEGER:
+        raise APIException('The {} is too big: {}'.format(name, value), status_code=400)
+    return number
+
+
+def get_filters(model):
+    # reads the filters of the url -> list of SQL conditions for .where(*conditions)
+    filter_columns = FILTER_COLUMNS.get(model, [])
+    model_keys = serialized_keys(model)
+    conditions = []
+    for param, value in request.args.items(multi=True):
+        name, _, operation = param.partition('__')
+        if name not in filter_columns:
+            # ?limit=, ?cursor=, ?fields=... are not filters, but ?name=... would be silently ignored
+            if name in model_keys and not filter_columns:
+                raise APIException('You can\'t filter the {}'.format(model.__tablename__), status_code=400)
+            if name in model_keys:
+                raise APIException('You can\'t filter by {}, use: {}'.format(name, ', '.join(filter_columns)), status_code=400)
+            continue
+        column = getattr(model, name)
+        # the text columns only have = and IN, the number columns also have the ranges
+        operations = ['in'] if column.type.python_type is str else ['in', *OPERATORS]
+        if operation == '':
+            conditions.append(column == parse_value(model, name, value))
+        elif operation == 'in':
+            conditions.append(column.in_([parse_value(model, name, item) for item in value.split(',')]))
+        elif operation in operations:
+            conditions.append(OPERATORS[operation](column, parse_value(model, name, value)))
+        else:
+            valid = [name] + ['{}__{}'.format(name, operation) for operation in operations]
+            raise APIException('{} is not a valid filter, use: {}'.format(param, ', '.join(valid)), status_code=400)
+    return conditions
+
+
+def get_sort(model):
+    # ?sort=population -> (Planets.population, False), ?sort=-population -> (Planets.population, True) = descending
+    # no ?sort= -> None (by id)
+    sort = request.args.get('sort')
+    if sort is None:
+        return None
+    name = sort.lstrip('-')
+    if name not in FILTER_COLUMNS.get(model, []):
+        raise APIException('You can\'t sort by {}, use: {}'.format(name, ', '.join(FILTER_COLUMNS.get(model, []))), status_code=400)
+    return getattr(model, name), sort.startswith('-')
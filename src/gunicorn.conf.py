@@ -0,0 +1,38 @@
+# gunicorn only reads ./gunicorn.conf.py of the folder it's started from (the repo root, not src/)
+# -> the start command must give it: gunicorn wsgi --chdir ./src/ -c ./src/gunicorn.conf.py (Procfile, render.yml)
+import os
+import sys
+import shutil
+
+# --preload by default: the app (code, models, metadata...) is built once in the master and the workers
+# share that memory (copy-on-write) -> less memory per worker, faster worker boot
+# GUNICORN_PRELOAD=0 -> each worker builds its own app (needed for --reload)
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+
+def on_starting(server):
+    # the metrics of the last run must not be added to this one (see metrics.py)
+    metrics_dir = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if metrics_dir:
+        shutil.rmtree(metrics_dir, ignore_errors=True)
+        os.makedirs(metrics_dir)
+
+
+def child_exit(server, worker):
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+
+def post_fork(server, worker):
+    # with --preload the db engines were made in the master: a worker must never use the master's connections
+    if not server.cfg.preload_app:
+        return
+    from pool import dispose_engines
+    for module_name in ['wsgi', 'asgi']:  # 'gunicorn wsgi' or 'gunicorn asgi:application -k uvicorn...'
+        module = sys.modules.get(module_name)
+        if module is None:
+            continue
+        dispose_engines(module.application if module_name == 'wsgi' else module.flask_app)
+        if module_name == 'asgi':
+            module.engine.sync_engine.dispose(close=False)
@@ -0,0 +1,67 @@
+import os
+import time
+import logging
+import threading
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Counts + times the SQL queries of every request
+# -> reply headers 'X-Query-Count: 4' and 'Server-Timing: db;dur=3.2, app;dur=7.9' (visible in the browser devtools)
+# -> 1 log line per request with the slowest statement, WARNING if it runs more than QUERY_COUNT_WARNING queries
+# helps to find handlers that ask the db the same thing twice
+
+QUERY_COUNT_WARNING = int(os.environ.get('QUERY_COUNT_WARNING', 10))
+logger = logging.getLogger('api.queries')
+# the queries of 1 request can run in several threads (FAVORITES_THREADS in favorites.py)
+count_lock = threading.Lock()
+
+
+# listening on the Engine class -> works for every engine the app creates
+@event.listens_for(Engine, 'before_cursor_execute')
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context.query_start = time.perf_counter()
+
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    # queries outside of a request (flask shell, migrations...) are not counted
+    if context is None or not has_request_context() or 'query_count' not in g:
+        return
+    elapsed = time.perf_counter() - context.query_start
+    with count_lock:
+        g.query_count += 1
+        g.query_time += elapsed
+        if elapsed > g.slowest_query[0]:
+            g.slowest_query = (elapsed, statement)
+
+
+def setup_query_timing(app):
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        g.query_count = 0
+        g.query_time = 0.0
+        g.slowest_query = (0.0, None)
+
+    @app.after_request
+    def add_timing_headers(response):
+        if 'query_count' not in g:
+            return response
+        # NB: streamed replies (NDJSON) run their queries after this, the log line below has the full count
+        response.headers['X-Query-Count'] = str(g.query_count)
+        response.headers['Server-Timing'] = 'db;dur={:.2f};desc="{} queries", app;dur={:.2f}'.format(
+            g.query_time * 1000, g.query_count, (time.perf_counter() - g.request_start) * 1000)
+        return response
+
+    @app.teardown_request
+    def log_queries(error=None):
+        if 'query_count' not in g:
+            return
+        level = logging.WARNING if g.query_count > QUERY_COUNT_WARNING else logging.INFO
+        slowest_time, slowest_statement = g.slowest_query
+        logger.log(level, '%s %s (%s) queries=%d db=%.2fms total=%.2fms slowest=%.2fms %s',
+                   request.method, request.path, request.endpoint, g.query_count, g.query_time * 1000,
+                   (time.perf_counter() - g.request_start) * 1000, slowest_time * 1000,
+                   ' '.join((slowest_statement or '').split())[:200])
@@ -0,0 +1,77 @@
+import os
+import time
+from flask import Response, g, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+from pool import on_pool_wait, on_pool_change
+
+# Prometheus metrics, labelled by the Flask endpoint name (api.handle_manyPlanets, api.handle_allUserFavs...) -> GET /metrics
+# with gunicorn set PROMETHEUS_MULTIPROC_DIR=/tmp/metrics: every worker writes its numbers in mmap files
+# in that folder (no locks between processes) and /metrics adds them all up (see gunicorn.conf.py)
+
+# the folder must exist before the 1st metric is made (POOL_WAIT opens its file right away): gunicorn.conf.py
+# empties it when gunicorn starts, but 'flask db upgrade', 'flask routes'... also import this file
+if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+
+REQUESTS = Counter('api_requests_total', 'HTTP requests', ['endpoint', 'method', 'status'])
+LATENCY = Histogram('api_request_duration_seconds', 'Time to build the reply', ['endpoint', 'method'], buckets=LATENCY_BUCKETS)
+IN_PROGRESS = Gauge('api_requests_in_progress', 'Requests being handled right now', ['endpoint'], multiprocess_mode='livesum')
+RESPONSE_SIZE = Histogram('api_response_size_bytes', 'Size of the reply body', ['endpoint'], buckets=SIZE_BUCKETS)
+POOL_WAIT = Histogram('api_db_pool_checkout_seconds', 'Time to get a connection from the db pool', buckets=LATENCY_BUCKETS)
+# 1 value per pool ('primary', 'read_0'... see pool.py) and worker, /metrics adds up the live workers
+POOL_CHECKED_OUT = Gauge('api_db_pool_checked_out', 'Db connections in use right now', ['pool'], multiprocess_mode='livesum')
+POOL_OVERFLOW = Gauge('api_db_pool_overflow', 'Db connections opened over DB_POOL_SIZE', ['pool'], multiprocess_mode='livesum')
+POOL_WAIT_TOTAL = Gauge('api_db_pool_wait_seconds', 'Time spent getting connections from the db pool since the worker started',
+                        ['pool'], multiprocess_mode='livesum')
+
+
+def update_pool_gauges(stats):
+    POOL_CHECKED_OUT.labels(stats['name']).set(stats['checked_out'])
+    POOL_OVERFLOW.labels(stats['name']).set(stats['overflow'])
+    POOL_WAIT_TOTAL.labels(stats['name']).set(stats['wait_seconds_total'])
+
+
+on_pool_wait(POOL_WAIT.observe)
+on_pool_change(update_pool_gauges)
+
+
+def record_request(endpoint, method, status, start, size=None):
+    # start = time.perf_counter() when the request came in, size = bytes of the body (None = unknown)
+    LATENCY.labels(endpoint, method).observe(time.perf_counter() - start)
+    REQUESTS.labels(endpoint, method, status).inc()
+    if size is not None:
+        RESPONSE_SIZE.labels(endpoint).observe(size)
+
+
+def setup_metrics(app):
+    @app.before_request
+    def start_metrics():
+        g.metrics_start = time.perf_counter()
+        g.metrics_endpoint = request.endpoint or 'none'  # 'none' = 404
+        IN_PROGRESS.labels(g.metrics_endpoint).inc()
+
+    @app.after_request
+    def record_metrics(response):
+        if 'metrics_endpoint' not in g:
+            return response
+        # streamed replies (NDJSON) don't know their size
+        record_request(g.metrics_endpoint, request.method, response.status_code, g.metrics_start, response.content_length)
+        return response
+
+    @app.teardown_request
+    def finish_metrics(error=None):
+        if 'metrics_endpoint' in g:
+            IN_PROGRESS.labels(g.metrics_endpoint).dec()
+
+
+def metrics_response():
+    if 'PROMETHEUS_MULTIPROC_DIR' in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), content_type=CONTENT_TYPE_LATEST)
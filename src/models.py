@@ -1,5 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
-db = SQLAlchemy()
+from replicas import RoutingSession
+# RoutingSession -> GET requests can read from a replica (see replicas.py)
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 # 'unique=True' = has to be unique
 # 'nullable=False' = can't be ignored 
@@ -34,8 +36,13 @@ class Users(db.Model):
 
 class Vehicles(db.Model):
     __tablename__ = 'vehicles'
+    # index (column, id) for the filters, ?sort= and the cursor of the next page (see filtering.py)
+    __table_args__ = (db.Index('ix_vehicles_cost_in_credits_id', 'cost_in_credits', 'id'),
+                      db.Index('ix_vehicles_crew_id', 'crew', 'id'),
+                      db.Index('ix_vehicles_max_atmosphering_speed_id', 'max_atmosphering_speed', 'id'),
+                      db.Index('ix_vehicles_vehicle_class_id', 'vehicle_class', 'id'))
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(50))
+    name = db.Column(db.String(50), index=True)  # index -> fast search by name (favorites)
     model = db.Column(db.String(50))
     vehicle_class = db.Column(db.String(50))
     manufacturer = db.Column(db.String(50))
@@ -68,8 +75,13 @@ class Vehicles(db.Model):
 
 class Planets(db.Model):
     __tablename__ = 'planets'
+    # index (column, id) for the filters, ?sort= and the cursor of the next page (see filtering.py)
+    __table_args__ = (db.Index('ix_planets_population_id', 'population', 'id'),
+                      db.Index('ix_planets_diameter_id', 'diameter', 'id'),
+                      db.Index('ix_planets_climate_id', 'climate', 'id'),
+                      db.Index('ix_planets_terrain_id', 'terrain', 'id'))
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(50))
+    name = db.Column(db.String(50), index=True)  # index -> fast search by name (favorites)
     diameter = db.Column(db.Integer)
     rotation_period = db.Column(db.Integer)
     orbital_period = db.Column(db.Integer)
@@ -97,8 +109,12 @@ class Planets(db.Model):
 
 class Characters(db.Model):
     __tablename__ = 'characters'
+    # index (column, id) for the filters, ?sort= and the cursor of the next page (see filtering.py)
+    __table_args__ = (db.Index('ix_characters_height_id', 'height', 'id'),
+                      db.Index('ix_characters_mass_id', 'mass', 'id'),
+                      db.Index('ix_characters_gender_id', 'gender', 'id'))
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(50))
+    name = db.Column(db.String(50), index=True)  # index -> fast search by name (favorites)
     gender = db.Column(db.String(50))
     height = db.Column(db.Integer)
     mass = db.Column(db.Integer)
@@ -124,10 +140,12 @@ class Characters(db.Model):
     
 class Favorite_Planets(db.Model):
     __tablename__ = 'favorite_planets'
+    # 1 user can't favorite the same thing twice, also works as the index for 'WHERE user_id = ...'
+    __table_args__ = (db.UniqueConstraint('user_id', 'planet_id', name='uq_favorite_planets_user_id_planet_id'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     user = db.relationship(Users)
-    planet_id = db.Column(db.Integer, db.ForeignKey('planets.id'))
+    planet_id = db.Column(db.Integer, db.ForeignKey('planets.id'), index=True)
     planet = db.relationship(Planets) # not a col, tells PC where to find col
 
     # what we will see when we employ the serialize function (returns a dictionary) 
@@ -140,10 +158,12 @@ class Favorite_Planets(db.Model):
 
 class Favorite_Characters(db.Model):
     __tablename__ = 'favorite_characters'
+    # 1 user can't favorite the same thing twice, also works as the index for 'WHERE user_id = ...'
+    __table_args__ = (db.UniqueConstraint('user_id', 'character_id', name='uq_favorite_characters_user_id_character_id'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     user = db.relationship(Users)
-    character_id = db.Column(db.Integer, db.ForeignKey('characters.id'))
+    character_id = db.Column(db.Integer, db.ForeignKey('characters.id'), index=True)
     character = db.relationship(Characters) # not a col, tells PC where to find col
     
     # what we will see when we employ the serialize function (returns a dictionary) 
@@ -156,10 +176,12 @@ class Favorite_Characters(db.Model):
     
 class Favorite_Vehicles(db.Model):
     __tablename__ = 'favorite_vehicles'
+    # 1 user can't favorite the same thing twice, also works as the index for 'WHERE user_id = ...'
+    __table_args__ = (db.UniqueConstraint('user_id', 'vehicle_id', name='uq_favorite_vehicles_user_id_vehicle_id'),)
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'))
     user = db.relationship(Users)
-    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id'))
+    vehicle_id = db.Column(db.Integer, db.ForeignKey('vehicles.id'), index=True)
     vehicle = db.relationship(Vehicles) # not a col, tells PC where to find col
     
     # what we will see when we employ the serialize function (returns a dictionary) 
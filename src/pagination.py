@@ -0,0 +1,116 @@
+import os
+import json
+import base64
+from flask import request
+from sqlalchemy import select, and_, or_, tuple_
+from utils import APIException
+from models import db
+from serialization import selected_columns, rows_to_dicts
+from filtering import parse_value, MAX_INTEGER
+
+# Keyset (cursor) pagination for the "GET ALL" endpoints
+# ?limit=20 -> how many rows per page (never more than MAX_PAGE_SIZE)
+# ?cursor=... -> the 'next_cursor' we sent in the previous reply
+# SQL Equiv. = SELECT * FROM x WHERE id > <last id> ORDER BY id LIMIT 20
+#  -> uses the primary key index, so page 1000 is as cheap as page 1 (OFFSET would read all the rows before it)
+# with ?sort=population (see filtering.py) the cursor is the last (population, id) we sent
+# SQL Equiv. = ... WHERE (population, id) > (500, 42) ORDER BY population, id LIMIT 20
+#  -> jumps straight to that spot of the (population, id) index, empty populations (NULL) go at the end like the biggest value
+
+DEFAULT_PAGE_SIZE = int(os.environ.get('DEFAULT_PAGE_SIZE', 100))
+MAX_PAGE_SIZE = int(os.environ.get('MAX_PAGE_SIZE', 1000))
+
+
+def encode_cursor(last_value):
+    # opaque for the client, it's just the last id (or [sort value, id]) we sent
+    return base64.urlsafe_b64encode(json.dumps(last_value, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        # put back the '=' padding we removed in encode_cursor
+        return json.loads(base64.urlsafe_b64decode((cursor + '=' * (-len(cursor) % 4)).encode()).decode())
+    except (ValueError, UnicodeError):
+        raise APIException('The cursor {} is not valid'.format(cursor), status_code=400)
+
+
+def get_page_args():
+    # reads ?limit= and ?cursor= from the url
+    try:
+        limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        raise APIException('The limit must be a number', status_code=400)
+    if limit < 1:
+        raise APIException('The limit must be bigger than 0', status_code=400)
+    limit = min(limit, MAX_PAGE_SIZE)
+
+    cursor = request.args.get('cursor')
+    last_value = decode_cursor(cursor) if cursor else None
+    return limit, last_value
+
+
+def sort_order(model, sort=None):
+    # sort = (column, descending) from filtering.get_sort(), None = by id
+    if sort is None:
+        return [model.id]
+    column, descending = sort
+    if descending:
+        return [column.desc().nulls_first(), model.id.desc()]
+    return [column.asc().nulls_last(), model.id]
+
+
+def is_id(value):
+    # true is an int for python and 10**30 doesn't fit in the db (the driver fails with a 500)
+    return isinstance(value, int) and not isinstance(value, bool) and -MAX_INTEGER - 1 <= value <= MAX_INTEGER
+
+
+def after_cursor(model, sort, last_value):
+    # SQL condition for "the rows after the cursor" in the order of sort_order()
+    if sort is None:
+        if not is_id(last_value):
+            raise APIException('The cursor is not valid without ?sort=', status_code=400)
+        return model.id > last_value
+
+    if not (isinstance(last_value, list) and len(last_value) == 2 and is_id(last_value[1])):
+        raise APIException('The cursor is not valid for ?sort={}'.format(request.args.get('sort')), status_code=400)
+    column, descending = sort
+    value, last_id = last_value
+    # the cursor comes from the client: the sort value must fit its column like a filter of the url
+    if value is not None:
+        try:
+            value = parse_value(model, column.key, value)
+        except APIException:
+            raise APIException('The cursor is not valid for ?sort={}'.format(request.args.get('sort')), status_code=400)
+    # NULL works like the biggest value: last with ascending, first with descending
+    if descending:
+        if value is None:
+            return or_(and_(column.is_(None), model.id < last_id), column.isnot(None))
+        return tuple_(column, model.id) < tuple_(value, last_id)
+    if value is None:
+        return and_(column.is_(None), model.id > last_id)
+    return or_(tuple_(column, model.id) > tuple_(value, last_id), column.is_(None))
+
+
+def paginate_serialized(model, fields=None, where=(), sort=None):
+    # returns (serialized dicts of this page, cursor of the next page or None if it's the last one)
+    # the dicts come straight from the columns, no ORM objects (see serialization.py)
+    # where = SQL conditions, sort = (column, descending) (see filtering.py)
+    limit, last_value = get_page_args()
+    columns = selected_columns(model, fields)
+    # + the id (and the sort value) at the end for the next cursor (even if ?fields= doesn't have them),
+    # zip() in rows_to_dicts ignores them
+    cursor_columns = [model.id.label('cursor_id')]
+    if sort is not None:
+        cursor_columns.append(sort[0].label('cursor_value'))
+    statement = select(*[column.label(key) for key, column in columns], *cursor_columns).where(*where)
+    if last_value is not None:
+        statement = statement.where(after_cursor(model, sort, last_value))
+    # ask for 1 more row than needed to know if there is a next page
+    rows = db.session.execute(statement.order_by(*sort_order(model, sort)).limit(limit + 1)).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last_row = rows[-1]
+        next_cursor = encode_cursor(last_row.cursor_id if sort is None else [last_row.cursor_value, last_row.cursor_id])
+    return rows_to_dicts([key for key, column in columns], rows), next_cursor
@@ -0,0 +1,118 @@
+import os
+import time
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import NullPool, QueuePool
+
+# Connection pool helpers
+# TimedPool goes in front of the pool class SQLAlchemy would choose for the db (QueuePool for postgres...)
+# and measures how long each checkout takes (waiting for a free connection + opening it if needed)
+# + tells the listeners (metrics.py) the numbers of the pool after every checkout / checkin (see pool_stats)
+#
+# the pool is configured with environment variables (defaults in brackets):
+#   DB_POOL_SIZE [5]          connections kept open per gunicorn worker
+#   DB_MAX_OVERFLOW [10]      extra connections when the pool is full (closed when returned)
+#   DB_POOL_TIMEOUT [30]      seconds to wait for a free connection before failing
+#   DB_POOL_RECYCLE [1800]    seconds before a connection is replaced (-1 = never)
+#   DB_POOL_PRE_PING [1]      test the connection before using it -> no errors after idle periods
+#   DB_POOL_USE_LIFO [0]      reuse the last returned connection first -> the rest can expire
+#   DB_PGBOUNCER [0]          PgBouncer in transaction mode: no pool here (NullPool) and no prepared statements
+
+POOL_WAIT_LISTENERS = []
+POOL_CHANGE_LISTENERS = []
+
+
+def on_pool_wait(callback):
+    # callback(seconds) is called after every checkout
+    POOL_WAIT_LISTENERS.append(callback)
+
+
+def on_pool_change(callback):
+    # callback(pool_stats(pool)) is called after every checkout and checkin
+    POOL_CHANGE_LISTENERS.append(callback)
+
+
+class TimedPool:
+    name = 'primary'  # 'primary', 'read_0'... -> the label of the pool in the metrics
+    checkouts = 0
+    checked_out = 0  # our own count: NullPool (sqlite, PgBouncer) doesn't keep one
+    wait_total = 0.0
+
+    def connect(self):
+        start = time.perf_counter()
+        connection = super().connect()
+        wait = time.perf_counter() - start
+        self.checkouts += 1
+        self.checked_out += 1
+        self.wait_total += wait
+        for callback in POOL_WAIT_LISTENERS:
+            callback(wait)
+        self.changed()
+        return connection
+
+    def _return_conn(self, record):
+        # checkin (not the 'checkin' event: engine.dispose() copies the listeners to the new pool)
+        super()._return_conn(record)
+        self.checked_out = max(self.checked_out - 1, 0)
+        self.changed()
+
+    def changed(self):
+        if POOL_CHANGE_LISTENERS:
+            stats = pool_stats(self)
+            for callback in POOL_CHANGE_LISTENERS:
+                callback(stats)
+
+
+def timed_pool_class(pool_class, name):
+    return type('Timed' + pool_class.__name__, (TimedPool, pool_class), {'name': name})
+
+
+def env_flag(name, default):
+    return os.environ.get(name, default).lower() in ('1', 'true', 'yes')
+
+
+def engine_options(database_url, name='primary'):
+    # options for create_engine -> app.config['SQLALCHEMY_ENGINE_OPTIONS']
+    # name = the label of its pool in the metrics
+    url = make_url(database_url)
+    options = {'pool_pre_ping': env_flag('DB_POOL_PRE_PING', '1'),
+               'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', 1800))}
+
+    if env_flag('DB_PGBOUNCER', '0'):
+        # PgBouncer already pools -> 1 real connection per checkout, closed when returned
+        options['poolclass'] = timed_pool_class(NullPool, name)
+        # prepared statements don't survive PgBouncer moving us to another server connection
+        driver = url.get_driver_name()
+        if driver == 'asyncpg':
+            options['connect_args'] = {'statement_cache_size': 0, 'prepared_statement_cache_size': 0}
+        elif driver == 'psycopg':
+            options['connect_args'] = {'prepare_threshold': None}
+        return options
+
+    pool_class = url.get_dialect().get_pool_class(url)
+    options['poolclass'] = timed_pool_class(pool_class, name)
+    if issubclass(pool_class, QueuePool):  # sqlite files use NullPool, they don't have a size
+        options['pool_size'] = int(os.environ.get('DB_POOL_SIZE', 5))
+        options['max_overflow'] = int(os.environ.get('DB_MAX_OVERFLOW', 10))
+        options['pool_timeout'] = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+        options['pool_use_lifo'] = env_flag('DB_POOL_USE_LIFO', '0')
+    return options
+
+
+def pool_stats(pool):
+    # numbers of 1 pool of this worker, e.g. pool_stats(db.engine.pool)
+    # overflow = connections opened over DB_POOL_SIZE (0 when the pool has no size)
+    stats = {'name': pool.name, 'pool': type(pool).__name__, 'checkouts': pool.checkouts,
+             'checked_out': pool.checked_out, 'overflow': 0, 'wait_seconds_total': round(pool.wait_total, 6)}
+    if isinstance(pool, QueuePool):
+        stats.update({'size': pool.size(), 'checked_out': pool.checkedout(), 'checked_in': pool.checkedin(), 'overflow': max(pool.overflow(), 0)})
+    return stats
+
+
+def dispose_engines(app):
+    # after a fork (gunicorn --preload, see gunicorn.conf.py): drop the connections the worker got from the master,
+    # it opens its own ones when it needs them
+    # close=False -> the sockets are not closed, they still belong to the master
+    from models import db  # models.py imports this file (through replicas.py)
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
@@ -0,0 +1,63 @@
+import os
+import time
+import itertools
+from flask import g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from pool import engine_options
+
+# Read replicas: DATABASE_READ_URLS=postgresql://replica1/db,postgresql://replica2/db
+# GET requests read from 1 replica (round robin, the same one for the whole request),
+# everything else (POST, PUT, PATCH, DELETE + the favorites they send back) uses the primary DATABASE_URL
+# READ_AFTER_WRITE_SECONDS [1]: after this worker writes, its GETs use the primary for a moment (replica lag)
+
+READ_URLS = [url.strip().replace('postgres://', 'postgresql://')
+             for url in os.environ.get('DATABASE_READ_URLS', '').split(',') if url.strip()]
+READ_AFTER_WRITE_SECONDS = float(os.environ.get('READ_AFTER_WRITE_SECONDS', 1))
+READ_BINDS = ['read_{}'.format(number) for number in range(len(READ_URLS))]
+
+next_read_bind = itertools.cycle(READ_BINDS).__next__ if READ_BINDS else None
+last_write = 0.0
+
+
+def read_replica_binds():
+    # -> app.config['SQLALCHEMY_BINDS'], Flask-SQLAlchemy creates 1 engine per replica
+    return {bind: {'url': url, **engine_options(url, bind)} for bind, url in zip(READ_BINDS, READ_URLS)}
+
+
+class RoutingSession(Session):
+    # db.session picks the replica of this request for reads, the primary for writes (flush)
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None and not self._flushing and has_request_context() and g.get('read_bind')
+                and time.monotonic() - last_write > READ_AFTER_WRITE_SECONDS):
+            return self._db.engines[g.read_bind]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def remember_write(session, flush_context):
+    global last_write
+    last_write = time.monotonic()
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def remember_statement_write(orm_execute_state):
+    # db.session.execute(insert/update/delete) writes without a flush (PUT / DELETE of resources.py, bulk.py)
+    global last_write
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        last_write = time.monotonic()
+
+
+def read_from_primary():
+    # the rest of this request reads from the primary, e.g. before filling the response cache (see response_cache.py)
+    g.pop('read_bind', None)
+
+
+def setup_read_replicas(app):
+    if not READ_BINDS:
+        return
+
+    @app.before_request
+    def choose_read_replica():
+        if request.method in ('GET', 'HEAD'):
+            g.read_bind = next_read_bind()
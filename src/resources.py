@@ -0,0 +1,152 @@
+from flask import request, jsonify
+from sqlalchemy import update, delete
+from sqlalchemy.exc import IntegrityError
+from models import db, Users, Planets, Vehicles, Characters
+from serialization import json_response, get_fields, get_serialized
+from pagination import paginate_serialized
+from streaming import wants_ndjson, stream_serialized
+from filtering import get_filters, get_sort
+from bulk import bulk_create
+from response_cache import cached_response
+
+# The CRUD endpoints of users, planets, vehicles and characters, made from the model instead of written 4 times
+# (they were the same code with other names), e.g. for Resource(Planets, 'planet'):
+#   GET    /planets           handle_manyPlanets   1 page (?limit, ?cursor, ?fields, filters, ?sort) or NDJSON
+#   GET    /planets/<id>      handle_onePlanet     ?fields
+#   POST   /planets           create_planet
+#   POST   /planets/bulk      create_planets_bulk  (see bulk.py)
+#   PUT    /planets/<id>      update_planet
+#   DELETE /planets/<id>      delete_planet
+# both GETs are cached until the table changes (see response_cache.py)
+# the body can only have the columns of the table (not the id): the list is made once, when the app starts
+# PUT and DELETE are 1 statement (UPDATE / DELETE ... WHERE id = 1), the row is never loaded:
+# the number of rows it changed (rowcount) says if the id exists
+
+# the session doesn't have to look for the row in its objects after an UPDATE / DELETE (it never loaded it)
+NO_SYNC = {'synchronize_session': False}
+
+
+class Resource:
+    def __init__(self, model, singular, upsert_key='name', unique=False):
+        self.model = model
+        self.singular = singular  # 'planet' -> error messages and endpoint names
+        self.plural = model.__tablename__  # 'planets' -> urls and the response cache
+        # upsert_key / unique -> see bulk.py, unique=True also means 2 rows can't have the same upsert_key
+        self.upsert_key = upsert_key
+        self.unique = unique
+        # what a POST / PUT body can have
+        self.fields = frozenset(model.__table__.columns.keys()) - {'id'}
+
+    def register(self, blueprint):
+        url = '/' + self.plural
+        item_url = url + '/<int:item_id>'
+        cached = cached_response(self.plural)
+        blueprint.add_url_rule(item_url, 'handle_one' + self.singular.capitalize(), cached(self.get_one), methods=['GET'])
+        blueprint.add_url_rule(url, 'handle_many' + self.model.__name__, cached(self.get_many), methods=['GET'])
+        blueprint.add_url_rule(url, 'create_' + self.singular, self.create, methods=['POST'])
+        blueprint.add_url_rule(url + '/bulk', 'create_{}_bulk'.format(self.plural), self.create_bulk, methods=['POST'])
+        blueprint.add_url_rule(item_url, 'update_' + self.singular, self.update, methods=['PUT'])
+        blueprint.add_url_rule(item_url, 'delete_' + self.singular, self.delete, methods=['DELETE'])
+
+    def not_found(self, item_id):
+        return jsonify({'error': 'The {} with id {} doesn\'t exist'.format(self.singular, item_id)}), 400
+
+    def check_body(self, body):
+        # returns the error message or None if the body is ok
+        if not isinstance(body, dict):
+            return 'You must send information with the body'
+        if 'name' in body and body['name'] is None:
+            return 'You must give the {} a name'.format(self.singular)
+        unknown = set(body) - self.fields
+        if unknown:
+            return 'Unknown fields: {}, use: {}'.format(', '.join(sorted(unknown)), ', '.join(sorted(self.fields)))
+        return None
+
+    def commit(self, statement=None):
+        # statement = UPDATE of 1 row by id, if it changes 0 rows -> None (that id doesn't exist)
+        # unique column (users email) -> the db says no, we don't need to ask it before
+        try:
+            if statement is not None and db.session.execute(statement, execution_options=NO_SYNC).rowcount == 0:
+                db.session.rollback()
+                return None
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            if not self.unique:
+                raise
+            return jsonify({'error': 'This {} already exists'.format(self.upsert_key)}), 400
+        return jsonify({'msg': 'ok'}), 200
+
+    # GET 1 ROW
+    def get_one(self, item_id):
+        # ?fields=id,name -> only those columns (see serialization.py)
+        # SQL Equiv. = SELECT * FROM planets WHERE id = 1
+        item_serialized = get_serialized(self.model, item_id, get_fields(self.model))
+        if item_serialized is None:
+            return self.not_found(item_id)
+        return jsonify({'msg': 'ok', 'info': item_serialized}), 200
+
+    # GET ALL ROWS
+    def get_many(self):
+        # ?climate=arid&population__gte=1000&sort=-population... (see filtering.py)
+        where, sort = get_filters(self.model), get_sort(self.model)
+        fields = get_fields(self.model)
+        # ?format=ndjson -> stream the whole table 1 row per line (see streaming.py)
+        if wants_ndjson():
+            return stream_serialized(self.model, fields, where, sort)
+        # SQL Equiv. = SELECT * FROM planets WHERE id > <cursor> ORDER BY id LIMIT <limit>
+        # only the serialized columns, no ORM objects + orjson when possible (see serialization.py)
+        items_serialized, next_cursor = paginate_serialized(self.model, fields, where, sort)
+        return json_response({'msg': 'ok', 'info': items_serialized, 'next_cursor': next_cursor})
+
+    # POST (CREATE) 1 ROW
+    def create(self):
+        body = request.get_json(silent=True)
+        error = self.check_body(body)
+        if error is None and 'name' not in body:
+            error = 'You must give the {} a name'.format(self.singular)
+        if error is not None:
+            return jsonify({'error': error}), 400
+
+        # SQL Equiv. = INSERT INTO planets(name, ...) VALUES ('example', ...), the missing fields stay NULL
+        db.session.add(self.model(**body))
+        return self.commit()
+
+    # POST (CREATE) MANY ROWS
+    def create_bulk(self):
+        # body = [{...}, {...}] or NDJSON, ?upsert=true (see bulk.py)
+        return bulk_create(self.model, upsert_key=self.upsert_key, unique=self.unique)
+
+    # PUT (UPDATE) 1 ROW
+    def update(self, item_id):
+        body = request.get_json(silent=True)
+        error = self.check_body(body)
+        if error is not None:
+            return jsonify({'error': error}), 400
+        if not body:
+            # nothing to change, only tell if it exists
+            if db.session.get(self.model, item_id) is None:
+                return self.not_found(item_id)
+            return jsonify({'msg': 'ok'}), 200
+
+        # SQL Equiv. = UPDATE planets SET climate = 'hot' WHERE id = 1 (only the fields that are in the body)
+        statement = update(self.model).where(self.model.id == item_id).values(**body)
+        return self.commit(statement) or self.not_found(item_id)
+
+    # DELETE 1 ROW
+    def delete(self, item_id):
+        # SQL Equiv. = DELETE FROM planets WHERE id = 1
+        result = db.session.execute(delete(self.model).where(self.model.id == item_id), execution_options=NO_SYNC)
+        if result.rowcount == 0:
+            db.session.rollback()
+            return self.not_found(item_id)
+        db.session.commit()
+        return jsonify({'msg': 'ok'}), 200
+
+
+RESOURCES = [
+    Resource(Users, 'user', upsert_key='email', unique=True),
+    Resource(Planets, 'planet'),
+    Resource(Vehicles, 'vehicle'),
+    Resource(Characters, 'character'),
+]
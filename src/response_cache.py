@@ -0,0 +1,130 @@
+import os
+import hashlib
+from functools import wraps
+from flask import Response, request, make_response
+from caching import LRUCache, on_table_change
+from streaming import wants_ndjson
+from replicas import read_from_primary
+from compression import accepted_encoding, should_compress, compress, encoded_etag
+
+# Response cache for the GET endpoints of data that rarely changes (catalogs)
+# key = generation of the tables + url with its args -> value = (etag, mimetype, JSON bytes)
+# 'If-None-Match: <etag>' -> 304 Not Modified without touching the db
+# the gzip / brotli version of a reply (see compression.py) is stored next to it under key + '|gzip'
+# -> a hot reply is compressed once, not on every hit
+# a commit that writes to a table bumps its generation -> old keys are never read again (and fall out of the LRU)
+# a miss is read from the primary, not from a read replica (see replicas.py): the replica can still have the rows
+# of before the commit, they would be cached under the new generation (for every worker with redis) until the TTL
+#
+# backend: in memory (1 per gunicorn worker) by default,
+# RESPONSE_CACHE_URL=redis://... -> shared by all workers (needs the 'redis' package)
+
+RESPONSE_CACHE_URL = os.environ.get('RESPONSE_CACHE_URL')
+RESPONSE_CACHE_SIZE = int(os.environ.get('RESPONSE_CACHE_SIZE', 1024))
+RESPONSE_CACHE_TTL = float(os.environ.get('RESPONSE_CACHE_TTL', 600))
+
+
+class MemoryBackend:
+    def __init__(self, max_size, ttl):
+        self.entries = LRUCache(max_size, ttl)
+        self.generations = {}
+
+    def get(self, key):
+        return self.entries.get(key)
+
+    def set(self, key, entry):
+        self.entries.set(key, entry)
+
+    def generation(self, table_name):
+        return self.generations.get(table_name, 0)
+
+    def bump(self, table_name):
+        self.generations[table_name] = self.generation(table_name) + 1
+
+
+class RedisBackend:
+    def __init__(self, url, ttl):
+        import redis  # only needed if RESPONSE_CACHE_URL is set
+        self.client = redis.Redis.from_url(url)
+        self.ttl = int(ttl)
+
+    def get(self, key):
+        data = self.client.get('response:' + key)
+        if data is None:
+            return None
+        etag, mimetype, body = data.split(b'\n', 2)
+        return etag.decode(), mimetype.decode(), body
+
+    def set(self, key, entry):
+        etag, mimetype, body = entry
+        self.client.set('response:' + key, etag.encode() + b'\n' + mimetype.encode() + b'\n' + body, ex=self.ttl)
+
+    def generation(self, table_name):
+        return int(self.client.get('generation:' + table_name) or 0)
+
+    def bump(self, table_name):
+        self.client.incr('generation:' + table_name)
+
+
+if RESPONSE_CACHE_URL:
+    backend = RedisBackend(RESPONSE_CACHE_URL, RESPONSE_CACHE_TTL)
+else:
+    backend = MemoryBackend(RESPONSE_CACHE_SIZE, RESPONSE_CACHE_TTL)
+
+CACHED_TABLES = set()
+
+
+def cache_key(table_names):
+    generations = ','.join('{}:{}'.format(name, backend.generation(name)) for name in table_names)
+    return generations + '|' + request.full_path
+
+
+def entry_response(entry, encoding=None):
+    etag, mimetype, body = entry
+    response = Response(body, mimetype=mimetype)
+    response.set_etag(etag)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    return response.make_conditional(request)  # -> 304 if If-None-Match matches
+
+
+def cached_response(*table_names):
+    # @cached_response('planets') under @app.route -> caches the reply until 'planets' changes
+    for table_name in table_names:
+        if table_name not in CACHED_TABLES:
+            CACHED_TABLES.add(table_name)
+            on_table_change(table_name, lambda table_name=table_name: backend.bump(table_name))
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            # NDJSON replies are streamed, they are not cached
+            if request.method != 'GET' or wants_ndjson():
+                return view(*args, **kwargs)
+
+            key = cache_key(table_names)
+            encoding = accepted_encoding()
+            if encoding is not None:
+                entry = backend.get(key + '|' + encoding)
+                if entry is not None:
+                    return entry_response(entry, encoding)
+
+            entry = backend.get(key)
+            if entry is None:
+                read_from_primary()
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.is_streamed:
+                    return response
+                body = response.get_data()
+                etag = hashlib.sha1(body).hexdigest()  # strong ETag = same bytes, same tag
+                entry = (etag, response.mimetype, body)
+                backend.set(key, entry)
+
+            etag, mimetype, body = entry
+            if encoding is not None and should_compress(mimetype, len(body)):
+                entry = (encoded_etag(etag, encoding), mimetype, compress(body, encoding))
+                backend.set(key + '|' + encoding, entry)
+                return entry_response(entry, encoding)
+            return entry_response(entry)
+        return wrapper
+    return decorator
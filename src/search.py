@@ -0,0 +1,137 @@
+import os
+import re
+from flask import request
+from sqlalchemy import DDL, event, false, func, literal, or_, select, text, union_all
+from utils import APIException
+from models import db, Planets, Vehicles, Characters
+
+# /search?q=... -> characters, planets and vehicles whose name (or a word of the name) starts with q
+# best results first: 1. names that start with q, A-Z (so the exact name is the 1st one)
+#                     2. if there is still room, names with another word that starts with q
+# e.g. ?q=death st -> 'Death Star', 'Death Star II', then 'Darth Vader's Death Star'...
+#
+# both steps read an index the db keeps up to date by itself (every gunicorn worker sees the same thing)
+# and stop after 'limit' rows, so 1 letter is as fast as a full name:
+#   1. index on lower(name) (COLLATE "C" on postgres) -> WHERE lower(name) >= 'de' AND lower(name) < 'df' ORDER BY lower(name)
+#   2. postgres -> trigram index (pg_trgm) on lower(name) for LIKE '% de%'
+#      sqlite   -> FTS5 table x_search, filled by triggers on x (inserts, bulk inserts, updates, deletes)
+#      others   -> plain LIKE (no special index)
+# created by db.create_all() (below) and by migration 7a3c9e5f1d28
+
+SEARCH_MODELS = {'characters': Characters, 'planets': Planets, 'vehicles': Vehicles}
+DEFAULT_SEARCH_LIMIT = int(os.environ.get('DEFAULT_SEARCH_LIMIT', 10))
+MAX_SEARCH_LIMIT = int(os.environ.get('MAX_SEARCH_LIMIT', 50))
+
+POSTGRES_DDL = [
+    'CREATE INDEX IF NOT EXISTS ix_{table}_name_lower ON {table} ((lower(name) COLLATE "C"))',
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'CREATE INDEX IF NOT EXISTS ix_{table}_name_trgm ON {table} USING gin (lower(name) gin_trgm_ops)',
+]
+SQLITE_DDL = [
+    'CREATE INDEX IF NOT EXISTS ix_{table}_name_lower ON {table} (lower(name))',
+    # content= -> the FTS table only keeps the index, the names stay in the normal table
+    "CREATE VIRTUAL TABLE IF NOT EXISTS {table}_search USING fts5(name, content='{table}', content_rowid='id', prefix='1 2 3')",
+    "INSERT INTO {table}_search({table}_search) VALUES ('rebuild')",
+    'CREATE TRIGGER IF NOT EXISTS {table}_search_insert AFTER INSERT ON {table} BEGIN '
+    'INSERT INTO {table}_search(rowid, name) VALUES (new.id, new.name); END',
+    'CREATE TRIGGER IF NOT EXISTS {table}_search_delete AFTER DELETE ON {table} BEGIN '
+    "INSERT INTO {table}_search({table}_search, rowid, name) VALUES ('delete', old.id, old.name); END",
+    'CREATE TRIGGER IF NOT EXISTS {table}_search_update AFTER UPDATE OF name ON {table} BEGIN '
+    "INSERT INTO {table}_search({table}_search, rowid, name) VALUES ('delete', old.id, old.name); "
+    'INSERT INTO {table}_search(rowid, name) VALUES (new.id, new.name); END',
+]
+
+
+def add_search_index(model):
+    # db.create_all() / db.drop_all() also create / drop the search index of the table
+    table = model.__table__
+    for statement in POSTGRES_DDL:
+        event.listen(table, 'after_create', DDL(statement.format(table=table.name)).execute_if(dialect='postgresql'))
+    for statement in SQLITE_DDL:
+        event.listen(table, 'after_create', DDL(statement.format(table=table.name)).execute_if(dialect='sqlite'))
+    # the triggers go away with the table, the FTS table doesn't
+    event.listen(table, 'before_drop', DDL('DROP TABLE IF EXISTS {}_search'.format(table.name)).execute_if(dialect='sqlite'))
+
+
+for search_model in SEARCH_MODELS.values():
+    add_search_index(search_model)
+
+
+def get_search_args():
+    # reads ?q= and ?limit= from the url
+    query = request.args.get('q', '').strip().lower()
+    if not query:
+        raise APIException('You must give something to search, e.g. /search?q=hoth', status_code=400)
+    try:
+        limit = int(request.args.get('limit', DEFAULT_SEARCH_LIMIT))
+    except ValueError:
+        raise APIException('The limit must be a number', status_code=400)
+    if limit < 1:
+        raise APIException('The limit must be bigger than 0', status_code=400)
+    return query, min(limit, MAX_SEARCH_LIMIT)
+
+
+def escape_like(value):
+    # '50%' -> '50\%' so the % and _ the user types aren't LIKE wildcards
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def lower_name(model, dialect):
+    # what the index of step 1 has: lower(name), in byte order -> 'de' <= x < 'df' = every x that starts with 'de'
+    name = func.lower(model.name)
+    return name.collate('C') if dialect == 'postgresql' else name
+
+
+def after_prefix(query):
+    # 'de' -> 'df' = the 1st text that doesn't start with 'de' anymore
+    return query[:-1] + chr(min(ord(query[-1]) + 1, 0x10FFFF))
+
+
+def word_matches(model, query, dialect):
+    # SQL condition: a word of the name (not only the 1st one) starts with query
+    if dialect == 'sqlite':
+        # FTS5: every word of the query is a word prefix -> 'death st' = "death"* AND "st"*
+        words = re.findall(r'\w+', query)
+        if not words:
+            return false()
+        match = ' '.join('"{}"*'.format(word) for word in words)
+        return text('{table}.id IN (SELECT rowid FROM {table}_search WHERE {table}_search MATCH :match)'.format(
+            table=model.__tablename__)).bindparams(match=match)
+    return func.lower(model.name).like('% ' + escape_like(query) + '%', escape='\\')
+
+
+def union_of(statements):
+    # UNION ALL of selects that have their own ORDER BY + LIMIT (they must be subqueries for that)
+    return union_all(*[select(statement.subquery()) for statement in statements]).subquery()
+
+
+def search_catalog(query, limit):
+    # returns [{'type': 'planets', 'id': 1, 'name': 'Hoth'}, ...], best results first
+    dialect = db.session.get_bind().dialect.name
+
+    # 1. SQL Equiv. = SELECT 'planets', id, name FROM planets WHERE lower(name) >= 'de' AND lower(name) < 'df'
+    #    ORDER BY lower(name) LIMIT 10 (+ the same for characters and vehicles, then the best 10 of the 30)
+    starts_with = []
+    for item_type, model in SEARCH_MODELS.items():
+        name = lower_name(model, dialect)
+        starts_with.append(select(literal(item_type).label('type'), model.id.label('id'), model.name.label('name'),
+                                  name.label('sort_name'))
+                           .where(name >= query, name < after_prefix(query)).order_by(name).limit(limit))
+    results = union_of(starts_with)
+    rows = db.session.execute(select(results.c.type, results.c.id, results.c.name)
+                              .order_by(results.c.sort_name, results.c.type, results.c.id).limit(limit)).all()
+
+    # 2. still room -> SQL Equiv. = SELECT 'planets', id, name FROM planets WHERE name LIKE '% de%' (not step 1 again)
+    #    ORDER BY id LIMIT <what's missing>
+    missing = limit - len(rows)
+    if missing > 0:
+        word_starts_with = []
+        for item_type, model in SEARCH_MODELS.items():
+            name = lower_name(model, dialect)
+            word_starts_with.append(select(literal(item_type).label('type'), model.id.label('id'), model.name.label('name'))
+                                    .where(word_matches(model, query, dialect), or_(name < query, name >= after_prefix(query)))
+                                    .order_by(model.id).limit(missing))
+        results = union_of(word_starts_with)
+        rows += db.session.execute(select(results.c.type, results.c.id, results.c.name)
+                                   .order_by(results.c.type, results.c.id).limit(missing)).all()
+    return [{'type': row.type, 'id': row.id, 'name': row.name} for row in rows]
@@ -0,0 +1,37 @@
+from flask import Response, current_app, request, stream_with_context
+from models import db
+from serialization import select_serialized, serialized_keys
+from pagination import sort_order
+
+# NDJSON = 1 JSON object per line -> the client can read it line by line
+# we send each row as soon as we read it (generator) instead of building the whole list
+# so memory stays flat however big the table is (used by the nightly sync jobs)
+# e.g. GET /planets?format=ndjson  or  'Accept: application/x-ndjson'
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+YIELD_PER = 1000  # rows fetched from the db cursor at a time
+
+
+def wants_ndjson():
+    if request.args.get('format') == 'ndjson':
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+
+def ndjson_response(rows):
+    # rows = any iterable of dictionaries
+    def generate():
+        for row in rows:
+            yield current_app.json.dumps(row) + '\n'
+    # stream_with_context keeps the app context (db.session) alive while we stream
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
+
+
+def stream_serialized(model, fields=None, where=(), sort=None):
+    # SQL Equiv. = SELECT * FROM x ORDER BY id, read YIELD_PER rows at a time from a server side cursor
+    # no ORM objects: plain tuples of the serialized columns (see serialization.py)
+    # where + sort = the filters of the url (see filtering.py)
+    statement = (select_serialized(model, fields).where(*where).order_by(*sort_order(model, sort))
+                 .execution_options(stream_results=True, yield_per=YIELD_PER))
+    keys = serialized_keys(model, fields)
+    return ndjson_response(dict(zip(keys, row)) for row in db.session.execute(statement))
@@ -1,4 +1,4 @@
-from flask import jsonify, url_for
+from flask import jsonify, url_for, request
 
 # url_for allows us to generate html inside python 
 
@@ -17,13 +17,43 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+def is_unique_violation(error):
+    # IntegrityError because of a UNIQUE constraint (not a foreign key, NOT NULL...)
+    orig = error.orig
+    if getattr(orig, 'pgcode', None) is not None:  # postgres
+        return orig.pgcode == '23505'
+    if 1062 in (getattr(orig, 'errno', None), orig.args[0] if orig.args else None):  # mysql 'Duplicate entry'
+        return True
+    return 'UNIQUE constraint failed' in str(orig)  # sqlite
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
     return len(defaults) >= len(arguments)
 
+def cached_page(app, name, build):
+    # builds the page on the 1st request, then the same one is reused
+    # -> the load balancer hitting / all the time doesn't run url_for for every route on each hit
+    # 1 page per prefix (SCRIPT_NAME): the urls start with it. The routes themselves can't change,
+    # Flask refuses new ones once the app has handled its 1st request
+    cache = app.extensions.setdefault('sitemap', {})
+    key = (name, request.script_root)
+    if key not in cache:
+        cache[key] = build(app)
+    return cache[key]
+
+def generate_route_index(app):
+    # JSON version of the sitemap for programs: every route (also the ones with <id>) and its methods
+    routes = []
+    for rule in app.url_map.iter_rules():
+        if rule.endpoint == 'static' or rule.rule.startswith('/admin'):
+            continue
+        routes.append({'url': request.script_root + rule.rule, 'endpoint': rule.endpoint,
+                       'methods': sorted(rule.methods - {'HEAD', 'OPTIONS'})})
+    return sorted(routes, key=lambda route: route['url'])
+
 def generate_sitemap(app):
-    links = ['/admin/']
+    links = [] if app.config.get('API_ONLY') else ['/admin/']
     for rule in app.url_map.iter_rules():
         # Filter out rules we can't navigate to in a browser
         # and rules that require parameters
@@ -0,0 +1,78 @@
+import gzip
+import json
+import asyncio
+import pytest
+
+pytest.importorskip('asgiref')
+pytest.importorskip('aiosqlite')
+
+# 1 event loop for all the calls, like a uvicorn worker (the pooled aiosqlite connections belong to it)
+loop = asyncio.new_event_loop()
+
+
+@pytest.fixture(scope='module')
+def asgi(tmp_path_factory):
+    # asgi.py builds its Flask app + async engine from DATABASE_URL when it's imported (once)
+    monkeypatch = pytest.MonkeyPatch()
+    monkeypatch.setenv('DATABASE_URL', 'sqlite:///{}'.format(tmp_path_factory.mktemp('asgi') / 'asgi.db'))
+    monkeypatch.delenv('ASYNC_DATABASE_URL', raising=False)
+    import asgi
+    monkeypatch.undo()
+    from models import db, Users, Planets
+    with asgi.flask_app.app_context():
+        db.create_all()
+        db.session.add_all([Users(name='Leia', email='leia@alderaan.com'), Planets(name='Hoth')])
+        db.session.commit()
+    yield asgi
+    loop.run_until_complete(asgi.engine.dispose())
+    with asgi.flask_app.app_context():
+        db.drop_all()
+
+
+def call(asgi, path, headers=()):
+    # 1 GET through the ASGI app -> (status, headers, body)
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'root_path': '', 'query_string': b'', 'scheme': 'http',
+             'http_version': '1.1', 'server': ('testserver', 80), 'client': ('127.0.0.1', 1234),
+             'headers': [(name.lower().encode(), value.encode()) for name, value in headers]}
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        messages.append(message)
+
+    loop.run_until_complete(asgi.application(scope, receive, send))
+    start = messages[0]
+    response_headers = {name.decode().lower(): value.decode() for name, value in start['headers']}
+    return start['status'], response_headers, b''.join(message.get('body', b'') for message in messages[1:])
+
+
+def test_user_favorites_fast_path_has_the_flask_extras(asgi):
+    from prometheus_client import REGISTRY
+    labels = {'endpoint': 'api.handle_userFavs', 'method': 'GET', 'status': '200'}
+    before = REGISTRY.get_sample_value('api_requests_total', labels) or 0
+
+    status, headers, body = call(asgi, '/users/1/favorites', [('Accept-Encoding', 'gzip')])
+    assert status == 200
+    assert headers['x-query-count'] == '4'
+    assert 'Accept-Encoding' in headers['vary']
+    assert json.loads(body)['user']['name'] == 'Leia'  # small reply -> not compressed
+    assert REGISTRY.get_sample_value('api_requests_total', labels) == before + 1
+
+
+def test_user_favorites_fast_path_compresses_big_replies(asgi, monkeypatch):
+    import compression
+    monkeypatch.setattr(compression, 'COMPRESS_MIN_SIZE', 1)
+    status, headers, body = call(asgi, '/users/1/favorites', [('Accept-Encoding', 'gzip')])
+    assert headers['content-encoding'] == 'gzip'
+    assert int(headers['content-length']) == len(body)
+    assert json.loads(gzip.decompress(body))['msg'] == 'ok'
+
+
+def test_cached_endpoints_go_through_flask(asgi):
+    status, headers, body = call(asgi, '/planets/1')
+    assert status == 200 and json.loads(body)['info']['name'] == 'Hoth'
+    assert 'x-query-count' in headers
+    status, headers, body = call(asgi, '/planets/1', [('If-None-Match', headers['etag'])])
+    assert status == 304
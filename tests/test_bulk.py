@@ -0,0 +1,38 @@
+def test_bulk_upsert_key_must_be_text(client):
+    response = client.post('/planets/bulk?upsert=true', json=[{'name': ['a']}, {'name': 'Hoth'}])
+    assert response.status_code == 200
+    assert response.json['created'] == 1
+    assert response.json['errors'] == [{'row': 0, 'error': 'The name must be a text'}]
+
+
+def test_bulk_unique_key_must_be_text(client):
+    response = client.post('/users/bulk', json=[{'name': 'x', 'email': ['a']}])
+    assert response.status_code == 200
+    assert response.json['errors'] == [{'row': 0, 'error': 'The email must be a text'}]
+
+
+def test_bulk_bad_rows_dont_stop_the_good_ones(client):
+    rows = [{'name': 'Tatooine'}, {'name': None}, {'name': 'Hoth', 'climate': ['frozen']}, {'name': 'Naboo'}]
+    response = client.post('/planets/bulk', json=rows)
+    assert response.status_code == 200
+    assert response.json['created'] == 2
+    assert response.json['errors'] == [{'row': 1, 'error': 'You must give the row a name'},
+                                       {'row': 2, 'error': 'The climate must be a text or a number'}]
+    names = [planet['name'] for planet in client.get('/planets').json['info']]
+    assert names == ['Tatooine', 'Naboo']
+
+
+def test_bulk_null_name_of_a_user(client):
+    response = client.post('/users/bulk', json=[{'name': None, 'email': 'a@a.com'}, {'name': 'Leia', 'email': 'l@a.com'}])
+    assert response.json['created'] == 1
+    assert response.json['errors'] == [{'row': 0, 'error': 'You must give the row a name'}]
+
+
+def test_bulk_rows_the_db_refuses_are_saved_one_by_one(client, monkeypatch):
+    # a problem only the db sees (a text in a number column on postgres...) -> only that row fails
+    import bulk
+    monkeypatch.setattr(bulk, 'check_values', lambda row, required: None)
+    response = client.post('/planets/bulk', json=[{'name': 'Tatooine'}, {'name': 'Hoth', 'climate': {'a': 1}}, {'name': 'Naboo'}])
+    assert response.json['created'] == 2
+    assert [error['row'] for error in response.json['errors']] == [1]
+    assert response.json['errors'][0]['error'].startswith('The row could not be saved')
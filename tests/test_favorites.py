@@ -0,0 +1,115 @@
+import pytest
+from models import db, Users, Planets, Vehicles, Characters, Favorite_Planets, Favorite_Vehicles, Favorite_Characters
+
+
+def seed_favorites(app, users):
+    # 'users' users, each one with 1 favorite planet, vehicle and character
+    with app.app_context():
+        planet, vehicle, character = Planets(name='Hoth'), Vehicles(name='Speeder'), Characters(name='Yoda')
+        db.session.add_all([planet, vehicle, character])
+        for number in range(users):
+            user = Users(name='user {}'.format(number), email='user{}@example.com'.format(number))
+            db.session.add_all([user,
+                                Favorite_Planets(user=user, planet=planet),
+                                Favorite_Vehicles(user=user, vehicle=vehicle),
+                                Favorite_Characters(user=user, character=character)])
+        db.session.commit()
+
+
+# 1 query for the users + 1 per favorite type, no matter how many users there are (no N+1)
+@pytest.mark.parametrize('users', [1, 10, 50])
+def test_all_users_favorites_query_count(app, client, users):
+    seed_favorites(app, users)
+    response = client.get('/users/favorites')
+    assert response.status_code == 200
+    assert len(response.json['users_favorites']) == users
+    assert response.headers['X-Query-Count'] == '4'
+
+
+@pytest.mark.parametrize('users', [1, 10, 50])
+def test_user_favorites_query_count(app, client, users):
+    seed_favorites(app, users)
+    response = client.get('/users/{}/favorites'.format(users))
+    assert response.status_code == 200
+    assert response.headers['X-Query-Count'] == '4'
+
+
+def test_all_users_favorites_keys(app, client):
+    seed_favorites(app, 1)
+    favorites = client.get('/users/favorites').json['users_favorites'][0]['favorites']
+    assert favorites['planets'][0]['favorite_planet']['name'] == 'Hoth'
+    assert favorites['vehicles'][0]['vehicle_info']['name'] == 'Speeder'
+    assert favorites['characters'][0]['character_info']['name'] == 'Yoda'
+    user_favorites = client.get('/users/1/favorites').json['user_favorites']
+    assert user_favorites['planets'][0]['planet_info']['name'] == 'Hoth'
+
+
+def test_is_unique_violation(app):
+    from sqlalchemy.exc import IntegrityError
+    from utils import is_unique_violation
+    seed_favorites(app, 1)
+    with app.app_context():
+        # the same favorite twice -> UNIQUE (user_id, planet_id)
+        db.session.add(Favorite_Planets(user_id=1, planet_id=1))
+        with pytest.raises(IntegrityError) as unique_error:
+            db.session.commit()
+        db.session.rollback()
+        assert is_unique_violation(unique_error.value)
+        # a user without a name -> NOT NULL, not a unique violation
+        db.session.add(Users(name=None))
+        with pytest.raises(IntegrityError) as not_null_error:
+            db.session.commit()
+        db.session.rollback()
+        assert not is_unique_violation(not_null_error.value)
+
+
+def test_patch_race_on_the_same_favorite(app, client):
+    # another request adds Hoth after we checked what the user already has, just before our INSERT -> 400, not a 500
+    import sqlite3
+    from sqlalchemy import event
+    seed_favorites(app, 1)
+    client.patch('/users/1/favorites', json={'remove': {'planets': ['Hoth']}})
+    with app.app_context():
+        engine = db.engine
+
+    def add_hoth_first(conn, cursor, statement, parameters, context, executemany):
+        if statement.startswith('INSERT INTO favorite_planets'):
+            other = sqlite3.connect(engine.url.database)
+            other.execute('INSERT INTO favorite_planets (user_id, planet_id) VALUES (1, 1)')
+            other.commit()
+            other.close()
+
+    event.listen(engine, 'before_cursor_execute', add_hoth_first)
+    try:
+        response = client.patch('/users/1/favorites', json={'add': {'planets': ['Hoth']}})
+    finally:
+        event.remove(engine, 'before_cursor_execute', add_hoth_first)
+    assert response.status_code == 400
+    assert 'another request' in response.json['error']
+
+
+def test_add_favorite_of_a_planet_deleted_by_another_worker(app, client):
+    # the name cache of this worker still has Naboo's id -> foreign key error, not 'already a favorite'
+    import sqlite3
+    from sqlalchemy import event
+    seed_favorites(app, 1)
+    with app.app_context():
+        db.session.add(Planets(name='Naboo'))
+        db.session.commit()
+        engine = db.engine
+    event.listen(engine, 'connect', lambda dbapi_connection, record: dbapi_connection.execute('PRAGMA foreign_keys=ON'))
+    engine.dispose()
+
+    assert client.post('/users/1/favorites/planet', json={'planet_name': 'Naboo'}).status_code == 200
+    assert client.delete('/users/1/favorites/planet', json={'planet_name': 'Naboo'}).status_code == 200
+    other = sqlite3.connect(engine.url.database)
+    other.execute("DELETE FROM planets WHERE name = 'Naboo'")
+    other.commit()
+    other.close()
+
+    response = client.post('/users/1/favorites/planet', json={'planet_name': 'Naboo'})
+    assert response.status_code == 400
+    assert response.json['error'] == 'This planet or this user doesn\'t exist anymore'
+    # the cache was emptied -> now it knows Naboo is gone
+    response = client.post('/users/1/favorites/planet', json={'planet_name': 'Naboo'})
+    assert response.json['error'] == 'You must specify an exisiting planet'
@@ -0,0 +1,37 @@
+import pytest
+from pagination import encode_cursor
+
+
+@pytest.mark.parametrize('value', [{'a': 1}, [1], 'many', True, 10 ** 30])
+def test_tampered_sort_cursor_is_a_400(client, value):
+    response = client.get('/planets?sort=population&cursor={}'.format(encode_cursor([value, 1])))
+    assert response.status_code == 400
+    assert response.json['message'] == 'The cursor is not valid for ?sort=population'
+
+
+def test_sort_cursor_goes_to_the_next_page(client):
+    for name, population in [('Hoth', 10), ('Naboo', 20), ('Tatooine', None)]:
+        client.post('/planets', json={'name': name, 'population': population})
+    page = client.get('/planets?sort=population&limit=1&fields=name').json
+    names = [page['info'][0]['name']]
+    while page['next_cursor']:
+        page = client.get('/planets?sort=population&limit=1&fields=name&cursor=' + page['next_cursor']).json
+        names += [planet['name'] for planet in page['info']]
+    assert names == ['Hoth', 'Naboo', 'Tatooine']
+
+
+@pytest.mark.parametrize('query', ['population=99999999999999999999999', 'population__gte=-99999999999999999999999',
+                                   'population__in=1,99999999999999999999999'])
+def test_filter_with_a_too_big_number_is_a_400(client, query):
+    response = client.get('/planets?' + query)
+    assert response.status_code == 400
+    assert 'too big' in response.json['message']
+
+
+@pytest.mark.parametrize('last_id', [True, 10 ** 30, -10 ** 30, 'a', 1.5])
+def test_tampered_id_cursor_is_a_400(client, last_id):
+    response = client.get('/planets?cursor=' + encode_cursor(last_id))
+    assert response.status_code == 400
+    assert response.json['message'] == 'The cursor is not valid without ?sort='
+    response = client.get('/planets?sort=population&cursor=' + encode_cursor([1, last_id]))
+    assert response.status_code == 400
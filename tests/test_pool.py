@@ -0,0 +1,27 @@
+from sqlalchemy import create_engine
+from pool import engine_options, pool_stats
+
+
+def test_pool_stats_follow_checkouts(tmp_path):
+    url = 'sqlite:///{}'.format(tmp_path / 'pool.db')
+    engine = create_engine(url, **engine_options(url, 'read_0'))
+    seen = []
+    engine.pool.changed = lambda: seen.append(pool_stats(engine.pool))
+    with engine.connect():
+        assert pool_stats(engine.pool)['checked_out'] == 1
+    assert [stats['checked_out'] for stats in seen] == [1, 0]
+    assert seen[-1]['name'] == 'read_0' and seen[-1]['checkouts'] == 1 and seen[-1]['overflow'] == 0
+
+    # the new pool made by dispose() starts from 0 and the old one doesn't report anymore
+    engine.dispose(close=False)
+    with engine.connect():
+        pass
+    assert pool_stats(engine.pool)['checkouts'] == 1 and pool_stats(engine.pool)['checked_out'] == 0
+
+
+def test_pool_gauges_in_metrics(client):
+    client.get('/planets')
+    body = client.get('/metrics').get_data(as_text=True)
+    assert 'api_db_pool_checked_out{pool="primary"} 0.0' in body
+    assert 'api_db_pool_overflow{pool="primary"} 0.0' in body
+    assert 'api_db_pool_wait_seconds{pool="primary"}' in body
@@ -0,0 +1,74 @@
+import pytest
+from models import db, Planets
+
+
+def add_planets(client, *names):
+    for name in names:
+        assert client.post('/planets', json={'name': name, 'climate': 'arid', 'population': 100}).status_code == 200
+
+
+def test_get_one_and_get_many(client):
+    add_planets(client, 'Tatooine', 'Hoth')
+    response = client.get('/planets/2')
+    assert response.status_code == 200
+    assert response.json['info']['name'] == 'Hoth'
+    assert client.get('/planets/2?fields=name').json['info'] == {'name': 'Hoth'}
+
+    response = client.get('/planets')
+    assert response.status_code == 200
+    assert [planet['name'] for planet in response.json['info']] == ['Tatooine', 'Hoth']
+    assert response.json['next_cursor'] is None
+
+
+@pytest.mark.parametrize('resource, singular', [('planets', 'planet'), ('vehicles', 'vehicle'),
+                                                ('characters', 'character'), ('users', 'user')])
+def test_get_one_missing_id(client, resource, singular):
+    response = client.get('/{}/7'.format(resource))
+    assert response.status_code == 400
+    assert response.json['error'] == 'The {} with id 7 doesn\'t exist'.format(singular)
+
+
+def test_post_unknown_key(client):
+    response = client.post('/planets', json={'name': 'Hoth', 'colour': 'white'})
+    assert response.status_code == 400
+    assert response.json['error'].startswith('Unknown fields: colour, use: ')
+
+
+@pytest.mark.parametrize('body', [{'climate': 'frozen'}, {'name': None}])
+def test_post_without_a_name(client, body):
+    response = client.post('/planets', json=body)
+    assert response.status_code == 400
+    assert response.json['error'] == 'You must give the planet a name'
+
+
+def test_post_duplicate_email(client):
+    user = {'name': 'Leia', 'email': 'leia@alderaan.com'}
+    assert client.post('/users', json=user).status_code == 200
+    response = client.post('/users', json=dict(user, name='Other Leia'))
+    assert response.status_code == 400
+    assert response.json['error'] == 'This email already exists'
+
+
+@pytest.mark.parametrize('method, body', [('put', {'climate': 'hot'}), ('put', {}), ('delete', None)])
+def test_put_and_delete_missing_id(client, method, body):
+    response = getattr(client, method)('/planets/9', json=body)
+    assert response.status_code == 400
+    assert response.json['error'] == 'The planet with id 9 doesn\'t exist'
+
+
+def test_put_changes_only_the_given_columns(app, client):
+    add_planets(client, 'Tatooine', 'Hoth')
+    response = client.put('/planets/1', json={'climate': 'hot'})
+    assert response.status_code == 200
+    with app.app_context():
+        tatooine, hoth = db.session.get(Planets, 1), db.session.get(Planets, 2)
+        assert (tatooine.name, tatooine.climate, tatooine.population) == ('Tatooine', 'hot', 100)
+        assert (hoth.name, hoth.climate, hoth.population) == ('Hoth', 'arid', 100)
+    # the cached GET sees the change
+    assert client.get('/planets/1').json['info']['climate'] == 'hot'
+
+
+def test_delete(client):
+    add_planets(client, 'Tatooine')
+    assert client.delete('/planets/1').status_code == 200
+    assert client.get('/planets/1').status_code == 400
@@ -0,0 +1,11 @@
+def test_route_index_is_built_once_per_prefix(app, client, monkeypatch):
+    assert client.get('/routes').status_code == 200
+    # the url map is not read again on the next hits
+    monkeypatch.setattr(app.url_map, 'iter_rules', lambda *args: [])
+    assert any(route['url'] == '/planets' for route in client.get('/routes').json['routes'])
+
+    # another prefix -> its own page, with the prefix in the urls
+    monkeypatch.undo()
+    routes = client.get('/routes', environ_overrides={'SCRIPT_NAME': '/v1'}).json['routes']
+    assert any(route['url'] == '/v1/planets' for route in routes)
+    assert any(route['url'] == '/planets' for route in client.get('/routes').json['routes'])